@@ -0,0 +1,155 @@
+import time
+from os.path import exists
+import numpy as np
+from sklearn.cluster import KMeans
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       ClusterPyramid.py is a cluster tree over the locations of a social network, built once so that the summary
+#       view can show any number of clusters without clustering again. Locations are first grouped into at most
+#       LEAVES small KMeans clusters (every location is its own leaf for smaller networks), which are then merged
+#       bottom up with Ward's criterion, always joining the two clusters whose merge adds the least squared distance
+#       to their centres. Undoing the last n - 1 merges leaves n clusters.
+#
+#       Locations are stored in the order the tree visits its leaves, so the locations of any tree node are one
+#       contiguous run and a cut at n is just the n nodes it keeps, found by looking at the last n - 1 merges.
+#
+# =====================================================================================================================
+
+
+class ClusterPyramid:
+    # Bump whenever the saved format or the clustering changes so old files are rebuilt
+    VERSION = 1
+    # Most leaves of the tree, and so the most clusters a cut can give
+    LEAVES = 1024
+    # Seed of the leaf KMeans so a network always gets the same tree
+    SEED = 0
+
+    # order lists location positions in leaf order. Node i covers order[starts[i]:ends[i]] and has its centre at
+    # centers[i]. Nodes below leafCount are leaves, node leafCount + j is made by merging children[j]
+    def __init__(self, leafCount, order, starts, ends, centers, children, buildTime=0.0):
+        self.leafCount = int(leafCount)
+        self.order = np.asarray(order, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        self.children = np.asarray(children, dtype=np.int32).reshape(-1, 2)
+        # Seconds spent building the tree, kept when it is saved
+        self.buildTime = float(buildTime)
+
+    # Builds the tree over an (n, 2) array of coordinates
+    @staticmethod
+    def build(coords):
+        began = time.perf_counter()
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        unique = len(np.unique(coords, axis=0))
+        if len(coords) <= ClusterPyramid.LEAVES:
+            labels = np.arange(len(coords), dtype=np.int32)
+        else:
+            kmeans = KMeans(n_clusters=min(unique, ClusterPyramid.LEAVES), n_init=1, random_state=ClusterPyramid.SEED)
+            labels = kmeans.fit_predict(coords).astype(np.int32)
+        # Relabel so every leaf has at least one location
+        leaves, labels = np.unique(labels, return_inverse=True)
+        leafCount = len(leaves)
+        counts = np.bincount(labels, minlength=leafCount).astype(np.float64)
+        centers = np.column_stack((np.bincount(labels, coords[:, 0], leafCount),
+                                   np.bincount(labels, coords[:, 1], leafCount))) / counts[:, None]
+        children, nodeCenters = ClusterPyramid.__merge(centers, counts)
+        # Leaf order from a depth first walk, which keeps every subtree contiguous
+        position = np.empty(leafCount, dtype=np.int64)
+        stack = [2 * leafCount - 2]
+        visited = 0
+        while stack:
+            node = stack.pop()
+            if node < leafCount:
+                position[node] = visited
+                visited += 1
+            else:
+                left, right = children[node - leafCount]
+                stack.append(right)
+                stack.append(left)
+        order = np.argsort(position[labels], kind="stable").astype(np.int32)
+        leafIndptr = np.zeros(leafCount + 1, dtype=np.int64)
+        np.cumsum(np.bincount(position[labels], minlength=leafCount), out=leafIndptr[1:])
+        starts = np.empty(2 * leafCount - 1, dtype=np.int64)
+        ends = np.empty(2 * leafCount - 1, dtype=np.int64)
+        starts[:leafCount] = leafIndptr[position]
+        ends[:leafCount] = leafIndptr[position + 1]
+        for merge, (left, right) in enumerate(children.tolist()):
+            starts[leafCount + merge] = min(starts[left], starts[right])
+            ends[leafCount + merge] = max(ends[left], ends[right])
+        return ClusterPyramid(leafCount, order, starts, ends, nodeCenters, children, time.perf_counter() - began)
+
+    # Ward merges of clusters with the given centres and sizes. Returns the children of every merge and the centres of
+    # all nodes. Merging never brings two other clusters closer under Ward's criterion, so only clusters whose nearest
+    # neighbour took part in a merge need to look for a new one
+    @staticmethod
+    def __merge(centers, counts):
+        m = len(centers)
+        slotCenters = centers.copy()
+        slotCounts = counts.copy()
+        slotNode = np.arange(m)
+        active = np.ones(m, dtype=bool)
+        nodeCenters = np.empty((max(2 * m - 1, 0), 2))
+        nodeCenters[:m] = centers
+        children = np.empty((max(m - 1, 0), 2), dtype=np.int32)
+
+        def costs(slot):
+            squared = ((slotCenters - slotCenters[slot]) ** 2).sum(axis=1)
+            cost = slotCounts * slotCounts[slot] / (slotCounts + slotCounts[slot]) * squared
+            cost[~active] = np.inf
+            cost[slot] = np.inf
+            return cost
+
+        nearest = np.zeros(m, dtype=np.int64)
+        nearestCost = np.full(m, np.inf)
+        for slot in range(m):
+            cost = costs(slot)
+            nearest[slot] = np.argmin(cost)
+            nearestCost[slot] = cost[nearest[slot]]
+        for merge in range(m - 1):
+            a = int(np.argmin(nearestCost))
+            b = int(nearest[a])
+            children[merge] = (slotNode[a], slotNode[b])
+            total = slotCounts[a] + slotCounts[b]
+            slotCenters[a] = (slotCenters[a] * slotCounts[a] + slotCenters[b] * slotCounts[b]) / total
+            slotCounts[a] = total
+            slotNode[a] = m + merge
+            nodeCenters[m + merge] = slotCenters[a]
+            active[b] = False
+            nearestCost[b] = np.inf
+            for slot in np.flatnonzero(active & ((nearest == a) | (nearest == b))).tolist() + [a]:
+                cost = costs(slot)
+                nearest[slot] = np.argmin(cost)
+                nearestCost[slot] = cost[nearest[slot]]
+        return children, nodeCenters
+
+    # Nodes left after undoing the last n - 1 merges, in location order. n is clamped to [1, leafCount]
+    def cut(self, n):
+        n = max(1, min(int(n), self.leafCount))
+        last = 2 * self.leafCount - n
+        nodes = [2 * self.leafCount - 2] if n == 1 else \
+            [node for node in self.children[last - self.leafCount:].ravel().tolist() if node < last]
+        nodes = np.array(nodes, dtype=np.int64)
+        return nodes[np.argsort(self.starts[nodes])]
+
+    # Saves the tree as a .npz file. checksum identifies the coordinates it was built from
+    def save(self, path, checksum):
+        with open(path, 'wb') as f:
+            np.savez(f, version=ClusterPyramid.VERSION, checksum=checksum, leaf_count=self.leafCount, order=self.order,
+                     starts=self.starts, ends=self.ends, centers=self.centers, children=self.children,
+                     build_time=self.buildTime)
+
+    # Loads a saved tree. Returns None if there is no file or it was built from different coordinates
+    @staticmethod
+    def load(path, checksum):
+        if not exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != ClusterPyramid.VERSION or str(data["checksum"]) != checksum:
+                return None
+            return ClusterPyramid(int(data["leaf_count"]), data["order"], data["starts"], data["ends"],
+                                  data["centers"], data["children"], float(data["build_time"]))
@@ -16,6 +16,8 @@ def main():
 
     query_user = "5352.0"
     number_of_hops = 2
+    # Users outside the min_core-core are left out of the community
+    min_core = 2
 
     graph = pg.plot(title="Road Network")
 
@@ -31,7 +33,7 @@ def main():
     query_rels = []
     for r in query_rels_raw:
         query_rels.append(r[0])
-    pre_tree = gen_tree(query_user, query_keywords, query_rels, 0.5, 0.5, socialNetwork, number_of_hops)
+    pre_tree = gen_tree(query_user, query_keywords, query_rels, 0.5, 0.5, socialNetwork, number_of_hops, min_core=min_core)
     tree = prune_tree(pre_tree, 0.01)
 
 
@@ -97,20 +99,24 @@ def main():
     app.quit()
     exit(app.exec_())
 
-def gen_tree(user, query_keywords, query_rels, g, h, network, hops, parents=[], distance=0, i=0):
+# query_keywords and query_rels become frozensets at the root and are passed down as they are. Relations with a core
+# number below min_core are skipped
+def gen_tree(user, query_keywords, query_rels, g, h, network, hops, parents=[], distance=0, i=0, min_core=0):
     # Do not repeat nodes
     parents.append(user)
+    query_keywords = frozenset(query_keywords)
+    query_rels = frozenset(query_rels)
 
     rels = network.getUserRel(user)
     rel_users = []
     for r in rels:
         rel_users.append(r[0])
-    rel_score = len(set(query_rels) & set(rel_users)) / len(set(query_rels) | set(rel_users))
+    rel_score = len(query_rels & set(rel_users)) / len(query_rels | set(rel_users))
 
     user_keywords = network.getUserKeywords(user)
-    keyword_intersect = list(set(user_keywords) & set(query_keywords))
-    keyword_union = list(set(user_keywords) | set(query_keywords))
-    keyword_score = len(keyword_intersect) / len(keyword_union)
+    keyword_intersect = query_keywords.intersection(user_keywords)
+    keyword_union = query_keywords.union(user_keywords)
+    keyword_score = len(keyword_intersect) / len(keyword_union) if keyword_union else 0
     
     deg_sim = (g * keyword_score) + (h * rel_score)
 
@@ -131,9 +137,9 @@ def gen_tree(user, query_keywords, query_rels, g, h, network, hops, parents=[],
     
 
     # Repeat for each relation of a child
-    for r in rels:
-        if r[0] not in parents:
-            result['children'].append(gen_tree(r[0], query_keywords, query_rels, g, h, network, hops, parents=parents, distance=distance + 1, i=i+1))
+    for r in network.usersWithCore([r for r in rel_users if r not in parents], min_core):
+        if r not in parents:
+            result['children'].append(gen_tree(r, query_keywords, query_rels, g, h, network, hops, parents=parents, distance=distance + 1, i=i+1, min_core=min_core))
     return result
 
 
@@ -0,0 +1,182 @@
+import heapq
+import math
+from os.path import exists
+import numpy as np
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       ContractionHierarchy.py is an exact point to point distance oracle for road networks. Nodes are contracted
+#       one at a time (least important first) and shortcuts are added wherever a shortest path would be lost. Only
+#       the upward edges (towards more important nodes) are kept, and a query is a bidirectional search that only
+#       climbs the hierarchy, so it settles a few dozen nodes instead of the whole graph.
+#
+# =====================================================================================================================
+
+
+class ContractionHierarchy:
+    # Bump whenever the saved format or the contraction changes so old files are rebuilt
+    VERSION = 1
+
+    def __init__(self, rank, indptr, indices, weights):
+        self.rank = np.asarray(rank, dtype=np.int32)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        # Number of nodes settled by the last query, used to compare against the other routing methods
+        self.settled = 0
+        # Upward adjacency as Python lists, the query loop is much faster on these than on numpy scalars
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        weights = self.weights.tolist()
+        self.__up = [list(zip(indices[indptr[v]:indptr[v + 1]], weights[indptr[v]:indptr[v + 1]]))
+                     for v in range(len(self.rank))]
+
+    # Number of shortcut and original edges kept in the upward graph
+    def edgeCount(self):
+        return len(self.indices)
+
+    # Contracts every node of a RoadGraph. witnessLimit bounds how many nodes a witness search may settle; a smaller
+    # limit preprocesses faster but may add shortcuts that are not needed. Results stay exact either way
+    @staticmethod
+    def build(graph, witnessLimit=64):
+        n = graph.nodeCount
+        adj = [{} for _ in range(n)]
+        indptr = graph.indptr.tolist()
+        indices = graph.indices.tolist()
+        weights = graph.weights.astype(np.float64).tolist()
+        for v in range(n):
+            for i in range(indptr[v], indptr[v + 1]):
+                adj[v][indices[i]] = weights[i]
+        rank = np.zeros(n, dtype=np.int32)
+        up = [None] * n
+        deleted = [0] * n
+        heap = []
+        for v in range(n):
+            heap.append((ContractionHierarchy.__priority(adj, v, deleted, witnessLimit)[0], v))
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            priority, v = heapq.heappop(heap)
+            # Lazy update: neighbours of contracted nodes change priority, so recompute before contracting
+            priority, shortcuts = ContractionHierarchy.__priority(adj, v, deleted, witnessLimit)
+            if heap and priority > heap[0][0]:
+                heapq.heappush(heap, (priority, v))
+                continue
+            rank[v] = order
+            order += 1
+            up[v] = adj[v]
+            for u, x, w in shortcuts:
+                if w < adj[u].get(x, math.inf):
+                    adj[u][x] = w
+                    adj[x][u] = w
+            for u in adj[v]:
+                del adj[u][v]
+                deleted[u] += 1
+            adj[v] = {}
+        # Store the upward edges as CSR
+        counts = [len(up[v]) for v in range(n)]
+        upIndptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=upIndptr[1:])
+        upIndices = np.fromiter((x for v in range(n) for x in up[v]), dtype=np.int32, count=int(upIndptr[-1]))
+        upWeights = np.fromiter((w for v in range(n) for w in up[v].values()), dtype=np.float64,
+                                count=int(upIndptr[-1]))
+        return ContractionHierarchy(rank, upIndptr, upIndices, upWeights)
+
+    # Edge difference heuristic: shortcuts added minus edges removed, plus the number of already contracted
+    # neighbours so contraction spreads evenly over the graph. Also returns the shortcuts contracting v would need
+    @staticmethod
+    def __priority(adj, v, deleted, witnessLimit):
+        shortcuts = ContractionHierarchy.__shortcuts(adj, v, witnessLimit)
+        return len(shortcuts) - len(adj[v]) + deleted[v], shortcuts
+
+    # Finds the shortcuts needed to keep every shortest path through v once v is removed
+    @staticmethod
+    def __shortcuts(adj, v, witnessLimit):
+        shortcuts = []
+        nbrs = list(adj[v].items())
+        for i in range(len(nbrs) - 1):
+            u, wu = nbrs[i]
+            targets = nbrs[i + 1:]
+            limit = wu + max(w for x, w in targets)
+            dist = ContractionHierarchy.__witnessSearch(adj, u, v, limit, witnessLimit)
+            for x, wx in targets:
+                via = wu + wx
+                if dist.get(x, math.inf) > via:
+                    shortcuts.append((u, x, via))
+        return shortcuts
+
+    # Dijkstra from source that never passes through skip. Stops past limit or after settling witnessLimit nodes.
+    # Every distance it returns is the length of a real path, so it can only ever miss a witness, never invent one
+    @staticmethod
+    def __witnessSearch(adj, source, skip, limit, witnessLimit):
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > limit or settled >= witnessLimit:
+                break
+            settled += 1
+            for x, w in adj[u].items():
+                if x == skip:
+                    continue
+                nd = d + w
+                if nd < dist.get(x, math.inf):
+                    dist[x] = nd
+                    heapq.heappush(heap, (nd, x))
+        return dist
+
+    # Exact shortest path distance between two node indices, inf when they are not connected. Runs a forward search
+    # from source and a backward search from target over upward edges only, alternating on the smaller key
+    def distance(self, source, target):
+        self.settled = 0
+        if source == target:
+            return 0.0
+        up = self.__up
+        dist = ({source: 0.0}, {target: 0.0})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best = math.inf
+        while heaps[0] or heaps[1]:
+            if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]):
+                side = 0
+            else:
+                side = 1
+            heap = heaps[side]
+            d, u = heapq.heappop(heap)
+            if d > dist[side][u]:
+                continue
+            # Nothing left in this direction can improve on the best meeting point
+            if d >= best:
+                heap.clear()
+                continue
+            self.settled += 1
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best = d + other
+            for x, w in up[u]:
+                nd = d + w
+                if nd < dist[side].get(x, math.inf):
+                    dist[side][x] = nd
+                    heapq.heappush(heap, (nd, x))
+        return best
+
+    # Saves the hierarchy as a .npz file. checksum identifies the edge and node files it was built from
+    def save(self, path, checksum):
+        with open(path, 'wb') as f:
+            np.savez(f, version=ContractionHierarchy.VERSION, checksum=checksum, rank=self.rank,
+                     indptr=self.indptr, indices=self.indices, weights=self.weights)
+
+    # Loads a saved hierarchy. Returns None if there is no file or it was built from different edge or node files
+    @staticmethod
+    def load(path, checksum):
+        if not exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != ContractionHierarchy.VERSION or str(data["checksum"]) != checksum:
+                return None
+            return ContractionHierarchy(data["rank"], data["indptr"], data["indices"], data["weights"])
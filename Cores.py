@@ -0,0 +1,151 @@
+import time
+from os.path import exists
+import numpy as np
+from Truss import TrussIndex
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Cores.py is the k-core decomposition of a social graph. The core number of a user is the largest k for which
+#       they are in the k-core, the largest subgraph where every user has at least k relations. Users are peeled in
+#       order of degree with bucket sorted arrays (Batagelj and Zaversnik), which takes linear time.
+#
+#       Adding or removing one relation changes core numbers by at most one, and only for users with the smaller core
+#       number of its two ends that are connected to that end through users with the same core number. Updates look
+#       at just those users and give the same result as decomposing the whole graph again.
+#
+# =====================================================================================================================
+
+
+class CoreIndex:
+    # Bump whenever the saved format or the decomposition changes so old files are rebuilt
+    VERSION = 1
+
+    def __init__(self, cores, buildTime=0.0):
+        self.cores = np.asarray(cores, dtype=np.int32)
+        # Seconds spent on the decomposition, kept when the index is saved
+        self.buildTime = float(buildTime)
+        # Neighbour sets for updates, built on the first update
+        self.__neighbors = None
+
+    # Decomposes a SocialGraph. Self relations do not count towards degrees
+    @staticmethod
+    def build(graph):
+        began = time.perf_counter()
+        adjacency = TrussIndex.adjacency(graph)
+        indptr = adjacency.indptr.tolist()
+        indices = adjacency.indices.tolist()
+        n = graph.userCount
+        degree = np.diff(adjacency.indptr).tolist()
+        # order holds users sorted by current degree, bins[d] is where degree d starts in order, pos the inverse
+        maxDegree = max(degree, default=0)
+        counts = [0] * (maxDegree + 2)
+        for d in degree:
+            counts[d + 1] += 1
+        bins = [0] * (maxDegree + 2)
+        for d in range(1, maxDegree + 2):
+            bins[d] = bins[d - 1] + counts[d]
+        order = [0] * n
+        pos = [0] * n
+        fill = bins[:]
+        for user in range(n):
+            pos[user] = fill[degree[user]]
+            order[pos[user]] = user
+            fill[degree[user]] += 1
+        for i in range(n):
+            user = order[i]
+            for neighbor in indices[indptr[user]:indptr[user + 1]]:
+                d = degree[neighbor]
+                if d > degree[user]:
+                    # Swap neighbor with the first user of its bin and shrink the bin from the left
+                    first = bins[d]
+                    other = order[first]
+                    order[first], order[pos[neighbor]] = neighbor, other
+                    pos[other], pos[neighbor] = pos[neighbor], first
+                    bins[d] += 1
+                    degree[neighbor] = d - 1
+        return CoreIndex(degree, time.perf_counter() - began)
+
+    # Starts update tracking from a SocialGraph's current relations, before the first edit is applied to the index
+    def track(self, graph):
+        if self.__neighbors is None:
+            adjacency = TrussIndex.adjacency(graph)
+            indptr = adjacency.indptr.tolist()
+            indices = adjacency.indices.tolist()
+            self.__neighbors = [set(indices[indptr[user]:indptr[user + 1]]) for user in range(len(self.cores))]
+
+    # Users with core number k connected to roots through users with core number k
+    def __subcore(self, roots, k):
+        cores = self.cores
+        subcore = {root for root in roots if cores[root] == k}
+        queue = list(subcore)
+        while queue:
+            user = queue.pop()
+            for neighbor in self.__neighbors[user]:
+                if neighbor not in subcore and cores[neighbor] == k:
+                    subcore.add(neighbor)
+                    queue.append(neighbor)
+        return subcore
+
+    # Peels users of subcore with at most limit neighbours that are either still in subcore or outside it with a
+    # core number of at least k. Returns the users peeled
+    def __peelSubcore(self, subcore, k, limit):
+        cores = self.cores
+        alive = set(subcore)
+        support = {user: sum(1 for neighbor in self.__neighbors[user]
+                             if neighbor in alive or (neighbor not in subcore and cores[neighbor] >= k))
+                   for user in subcore}
+        queue = [user for user in subcore if support[user] <= limit]
+        while queue:
+            user = queue.pop()
+            if user not in alive:
+                continue
+            alive.discard(user)
+            for neighbor in self.__neighbors[user]:
+                if neighbor in alive:
+                    support[neighbor] -= 1
+                    if support[neighbor] <= limit:
+                        queue.append(neighbor)
+        return subcore - alive
+
+    # Adds the relation between users a and b and updates the core numbers around it. track() must have been called
+    # before the graph was edited
+    def insertEdge(self, a, b):
+        if a == b or b in self.__neighbors[a]:
+            return
+        self.__neighbors[a].add(b)
+        self.__neighbors[b].add(a)
+        k = int(min(self.cores[a], self.cores[b]))
+        subcore = self.__subcore([a, b], k)
+        # Users keeping more than k neighbours at core number k or more move up to the (k + 1)-core
+        stay = subcore - self.__peelSubcore(subcore, k, k)
+        self.cores[list(stay)] += 1
+
+    # Removes the relation between users a and b and updates the core numbers around it
+    def deleteEdge(self, a, b):
+        if b not in self.__neighbors[a]:
+            return
+        self.__neighbors[a].discard(b)
+        self.__neighbors[b].discard(a)
+        k = int(min(self.cores[a], self.cores[b]))
+        subcore = self.__subcore([a, b], k)
+        # Users left with fewer than k neighbours at core number k or more drop to the (k - 1)-core
+        dropped = self.__peelSubcore(subcore, k, k - 1)
+        self.cores[list(dropped)] -= 1
+
+    # Saves the core numbers as a .npz file. checksum identifies the rel file they were built from
+    def save(self, path, checksum):
+        with open(path, 'wb') as f:
+            np.savez(f, version=CoreIndex.VERSION, checksum=checksum, cores=self.cores, build_time=self.buildTime)
+
+    # Loads saved core numbers. Returns None if there is no file or it was built from a different rel file
+    @staticmethod
+    def load(path, checksum):
+        if not exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != CoreIndex.VERSION or str(data["checksum"]) != checksum:
+                return None
+            return CoreIndex(data["cores"], float(data["build_time"]))
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from os.path import exists, getsize
+import numpy as np
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       DistanceCache.py remembers road network distances between pairs of road nodes across sessions. Recently used
+#       distances live in an in-memory LRU. Every distance is also appended to a cache file next to the road network
+#       files, which is read back into sorted arrays the next time the network is loaded. The file starts with the
+#       checksum of the edge and node files and is thrown away when either of them changes.
+#
+# =====================================================================================================================
+
+
+class DistanceCache:
+    MAGIC = b"SSNDIST1"
+    RECORD = np.dtype([("a", "<i4"), ("b", "<i4"), ("distance", "<f8")])
+
+    def __init__(self, path, checksum, capacity=100000):
+        self.path = path
+        self.capacity = capacity
+        # Lookups answered by the in-memory LRU, by the on-disk tier and not answered at all
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.__memory = OrderedDict()
+        # On-disk tier, as sorted pair keys and their distances
+        self.__diskKeys = np.empty(0, dtype=np.int64)
+        self.__diskValues = np.empty(0, dtype=np.float64)
+        header = self.MAGIC + checksum.encode("ascii")
+        if self.__readHeader(len(header)) == header:
+            count = (getsize(path) - len(header)) // self.RECORD.itemsize
+            records = np.fromfile(path, dtype=self.RECORD, count=count, offset=len(header))
+            self.__mergeDisk(self.keys(records["a"], records["b"]), records["distance"])
+        else:
+            # Missing, unreadable or built from a different edge or node file
+            with open(path, "wb") as f:
+                f.write(header)
+        self.__file = open(path, "ab")
+
+    def __readHeader(self, length):
+        if not exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            return f.read(length)
+
+    # Packs node pairs into int64 keys. Distances are symmetric so (a, b) and (b, a) share a key
+    @staticmethod
+    def keys(a, b):
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        return (np.minimum(a, b) << 32) | np.maximum(a, b)
+
+    # Adds entries to the sorted on-disk arrays, later entries win over earlier ones with the same key
+    def __mergeDisk(self, keys, values):
+        keys = np.concatenate((self.__diskKeys, keys))
+        values = np.concatenate((self.__diskValues, values))
+        # Stable sort then keep the last copy of every key
+        order = np.argsort(keys, kind="stable")
+        keys, values = keys[order], values[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        self.__diskKeys = keys[last]
+        self.__diskValues = values[last]
+
+    # Returns the cached distance between two node indices or None
+    def get(self, a, b):
+        distance = self.getMany(a, [b])[0]
+        return None if np.isnan(distance) else float(distance)
+
+    # Returns the cached distances from node a to every node in targets, nan where the distance is not cached
+    def getMany(self, a, targets):
+        keys = self.keys(np.full(len(targets), a), targets)
+        distances = np.full(len(keys), np.nan)
+        if len(self.__diskKeys):
+            pos = np.minimum(np.searchsorted(self.__diskKeys, keys), len(self.__diskKeys) - 1)
+            onDisk = self.__diskKeys[pos] == keys
+            distances[onDisk] = self.__diskValues[pos[onDisk]]
+            self.diskHits += int(np.count_nonzero(onDisk))
+        for i in np.flatnonzero(np.isnan(distances)):
+            key = int(keys[i])
+            if key in self.__memory:
+                self.__memory.move_to_end(key)
+                distances[i] = self.__memory[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+        return distances
+
+    # Stores the distances from node a to every node in targets
+    def putMany(self, a, targets, distances):
+        keys = self.keys(np.full(len(targets), a), targets)
+        distances = np.asarray(distances, dtype=np.float64)
+        keys, first = np.unique(keys, return_index=True)
+        distances = distances[first]
+        for key, distance in zip(keys.tolist(), distances.tolist()):
+            self.__memory[key] = distance
+            self.__memory.move_to_end(key)
+        # Append to the cache file so the next session can read them back
+        records = np.empty(len(keys), dtype=self.RECORD)
+        records["a"] = keys >> 32
+        records["b"] = keys & 0xFFFFFFFF
+        records["distance"] = distances
+        self.__file.write(records.tobytes())
+        self.__file.flush()
+        # Entries evicted from memory are already in the file, move them into the on-disk tier
+        if len(self.__memory) > self.capacity:
+            evicted = len(self.__memory) - self.capacity // 2
+            keys = np.empty(evicted, dtype=np.int64)
+            values = np.empty(evicted, dtype=np.float64)
+            for i in range(evicted):
+                keys[i], values[i] = self.__memory.popitem(last=False)
+            self.__mergeDisk(keys, values)
+
+    # Stores the distance between two node indices
+    def put(self, a, b, distance):
+        self.putMany(a, [b], [distance])
+
+    # Hit and miss counters for display
+    def stats(self):
+        return {"hits": self.hits, "diskHits": self.diskHits, "misses": self.misses,
+                "memoryEntries": len(self.__memory), "diskEntries": len(self.__diskKeys)}
+
+    def close(self):
+        self.__file.close()
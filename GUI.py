@@ -347,7 +347,10 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
 
 
     def interactiveKdVisualNodes(self, tree, graph=nx.Graph()):
-        tempTitle = '<p>Number of hops: ' + str(tree["hops"]) + '</p><p>Distance: ' + str(tree["distance"]) + '</p><p>Common Keywords:</p><ol>'
+        tempTitle = '<p>Number of hops: ' + str(tree["hops"]) + '</p><p>Distance: ' + str(tree["distance"]) + '</p>'
+        if "roadDistance" in tree:
+            tempTitle += '<p>Road Distance: ' + str(tree["roadDistance"]) + '</p>'
+        tempTitle += '<p>Common Keywords:</p><ol>'
         for key in tree["keywords"]:
             tempTitle += '<li>' + str(self.selectedSocialNetwork.getKeywordByID(key)) + '</li>'
         tempTitle += '</ol>'
@@ -490,7 +493,7 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
             #self.visualizeKdData(kd, keys, hops, dists)
             self.CTstart = time.time()
             res = self.queryInput.getKdResponse()
-            kdTree = self.getKDTrust(res[0], res[1], res[2])
+            kdTree = self.getKDTrust(res[0], res[1], res[2], res[3])
             self.visualizeKdData(kdTree)
             # Stop counting time for query
             self.CTend = time.time()
@@ -650,7 +653,7 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
             self.CTstart = time.time()
             #community = self.communityTree(self.queryUser[0], queryKeywords, queryRels, float(self.__windows[6].kcTextBox.text()), float(self.__windows[6].kTextBox.text()), float(self.__windows[6].rTextBox.text()), float(self.__windows[6].dTextBox.text()), float(self.__windows[6].eTextBox.text()),[], 0, 0)
             res = self.queryInput.getCommunityResponse()
-            community = self.communityTree(self.queryUser[0], queryKeywords, queryRels, float(res[0]), float(res[3]), float(res[4]), float(res[1]), float(res[2]), [], 0, 0)
+            community = self.communityTree(self.queryUser[0], queryKeywords, queryRels, float(res[0]), float(res[3]), float(res[4]), float(res[1]), float(res[2]), [], 0, 0, minCore=int(res[6]))
             community = self.pruneTree(community)
             temp_users = self.treeUsers()
             users = list(set(temp_users[0]) | set(temp_users[1]))
@@ -736,7 +739,7 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
                 if i == 0:
                     queryKeywords = self.queryInput.getCommunityKeywords()
                     
-                    queryKeywords += self.selectedSocialNetwork.getUserKeywordsInTime(self.queryUser[0], res[6], res[7])
+                    queryKeywords += self.selectedSocialNetwork.getUserKeywordsActive(self.queryUser[0], res[6], res[7])
                     queryRelsRaw = self.selectedSocialNetwork.getUserRel(self.queryUser[0])
                     queryPois = self.selectedSocialNetwork.getUserPoiInTime(self.queryUser[0], res[6], res[7])
                     queryRels = []
@@ -757,7 +760,8 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
                         float(res[2]), 
                         [], 
                         0,
-                        0)
+                        0,
+                        minCore=int(res[8]))
                     self.__queryFrames.append(self.pruneTree(community))
                     frame_users = self.treeUsers(community)
                     temp_users = list(set(frame_users[0]) | set(frame_users[1]))
@@ -766,7 +770,7 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
                     date = str(self.query_dates[i-1])
                     queryKeywords = self.queryInput.getCommunityKeywords()
                     res = self.queryInput.getCommunityTimeResponse()
-                    queryKeywords += self.selectedSocialNetwork.getUserKeywordsInTime(self.queryUser[0], res[6], date)
+                    queryKeywords += self.selectedSocialNetwork.getUserKeywordsActive(self.queryUser[0], res[6], date)
                     queryRelsRaw = self.selectedSocialNetwork.getUserRel(self.queryUser[0])
                     queryPois = self.selectedSocialNetwork.getUserPoiInTime(self.queryUser[0], res[6], date)
                     queryRels = []
@@ -787,7 +791,8 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
                         float(res[2]), 
                         [], 
                         0,
-                        0)
+                        0,
+                        minCore=int(res[8]))
                     self.__queryFrames.append(self.pruneTree(community))
                     frame_users = self.treeUsers(community)
                     temp_users = list(set(frame_users[0]) | set(frame_users[1]))
@@ -807,7 +812,7 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
             self.updateTimeline()
 
     #Generate kdtrust from input
-    def getKDTrust(self, keywords, hops, distance):
+    def getKDTrust(self, keywords, hops, distance, minCore=0):
         if self.queryUser is not None:
  
             #kd = KDTrust(self.selectedRoadNetwork, self.selectedSocialNetwork, self.queryUser[0], float(keywords), float(distance), float(hops))
@@ -819,8 +824,10 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
 
             print(distance)
 
-            kdTree = self.kdTree(queryKeywords, self.queryUser[0], float(keywords), float(distance), float(hops), 0, 0, [])
+            kdTree = self.kdTree(queryKeywords, self.queryUser[0], float(keywords), float(distance), float(hops), 0, 0, [], minCore=int(minCore))
             kdTree = self.pruneTree(kdTree)
+            if self.selectedRoadNetwork is not None:
+                kdTree = self.roadDistanceTree(kdTree)
             """
             # Users with common keywords
             common, keys = self.usersCommonKeyword(k=float(keywords))
@@ -1192,6 +1199,24 @@ class Gui(QtWidgets.QMainWindow, TreeMixin):
         StatsLayout.addWidget(SummaryTimeLabel)
         ClusterTimeLabel = QtWidgets.QLabel("Query Response Time: " + str("{0:.3f}".format(self.ClusterResponseTime)) + " ms")
         StatsLayout.addWidget(ClusterTimeLabel)
+        if self.selectedRoadNetwork is not None and self.selectedRoadNetwork.distanceCache is not None:
+            cache = self.selectedRoadNetwork.distanceCache.stats()
+            CacheLabel = QtWidgets.QLabel("Road Distance Cache: " + str(cache["hits"]) + " memory hits, " +
+                                          str(cache["diskHits"]) + " disk hits, " + str(cache["misses"]) + " misses")
+            StatsLayout.addWidget(CacheLabel)
+        if self.selectedSocialNetwork is not None and self.selectedSocialNetwork.hopLabels is not None:
+            labels = self.selectedSocialNetwork.hopLabels.stats()
+            LabelsLabel = QtWidgets.QLabel("Hop Labels: " + str(labels["labels"]) + " entries (" +
+                                           "{0:.1f}".format(labels["averageLabel"]) + " per user), built in " +
+                                           "{0:.2f}".format(labels["buildTime"]) + " s, " +
+                                           "{0:.1f}".format(labels["queryLatency"] * 1e6) + " µs per query")
+            StatsLayout.addWidget(LabelsLabel)
+        if self.selectedSocialNetwork is not None and self.selectedSocialNetwork.clusterRuns:
+            run = self.selectedSocialNetwork.clusterRuns[-1]
+            ClusteringLabel = QtWidgets.QLabel("Summary Clustering: " + run["clustering"] + ", " + str(run["n"]) +
+                                               " clusters in " + "{0:.3f}".format(run["fitTime"] * 1000) +
+                                               " ms, inertia " + "{0:.4g}".format(run["inertia"]))
+            StatsLayout.addWidget(ClusteringLabel)
         StatsLayout.addStretch()
         
         self.__windows[8].setLayout(StatsLayout)
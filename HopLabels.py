@@ -0,0 +1,124 @@
+import time
+from os.path import exists
+import numpy as np
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       HopLabels.py is an exact hop distance oracle for social graphs built with pruned landmark labeling. Every user
+#       gets a label of (hub, hops) pairs such that any two connected users share a hub on one of their fewest hop
+#       paths (a 2-hop cover). Users are processed from the highest degree down, each running a breadth first search
+#       that stops wherever the labels built so far already give the right distance, which keeps the labels small.
+#       A query merges two sorted labels instead of searching the graph.
+#
+# =====================================================================================================================
+
+
+class HopLabels:
+    # Bump whenever the saved format or the labelling changes so old files are rebuilt
+    VERSION = 1
+
+    # order lists users from the first hub to the last. Label entries of user u are hubs[indptr[u]:indptr[u + 1]]
+    # (hub ranks in increasing order) and the hops to each of them
+    def __init__(self, order, indptr, hubs, hops, buildTime=0.0):
+        self.order = np.asarray(order, dtype=np.int32)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.hubs = np.asarray(hubs, dtype=np.int32)
+        self.hops = np.asarray(hops, dtype=np.int16)
+        # Seconds spent labelling, kept when the labels are saved
+        self.buildTime = float(buildTime)
+        # Number of queries answered and the time spent on them, for display
+        self.queries = 0
+        self.queryTime = 0.0
+
+    # Total number of (hub, hops) entries over all labels
+    def labelCount(self):
+        return len(self.hubs)
+
+    # Labels every user of a SocialGraph
+    @staticmethod
+    def build(graph):
+        began = time.perf_counter()
+        n = graph.userCount
+        indptr, indices = graph.undirected()
+        order = np.argsort(-np.diff(indptr), kind="stable")
+        indptr = indptr.tolist()
+        indices = indices.tolist()
+        labelHubs = [[] for _ in range(n)]
+        labelHops = [[] for _ in range(n)]
+        # Hops from the current root to each hub of its label, indexed by hub rank
+        rootHops = [n] * n
+        seen = [False] * n
+        for rank, root in enumerate(order.tolist()):
+            for hub, hops in zip(labelHubs[root], labelHops[root]):
+                rootHops[hub] = hops
+            frontier = [root]
+            seen[root] = True
+            visited = [root]
+            hop = 0
+            while frontier:
+                following = []
+                for user in frontier:
+                    # Pruned: a hub labelled earlier already lies on a path this short
+                    if any(rootHops[hub] + hops <= hop for hub, hops in zip(labelHubs[user], labelHops[user])):
+                        continue
+                    labelHubs[user].append(rank)
+                    labelHops[user].append(hop)
+                    for neighbor in indices[indptr[user]:indptr[user + 1]]:
+                        if not seen[neighbor]:
+                            seen[neighbor] = True
+                            visited.append(neighbor)
+                            following.append(neighbor)
+                frontier = following
+                hop += 1
+            for user in visited:
+                seen[user] = False
+            for hub in labelHubs[root]:
+                rootHops[hub] = n
+        counts = np.array([len(hubs) for hubs in labelHubs], dtype=np.int64)
+        labelIndptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=labelIndptr[1:])
+        hubs = np.fromiter((hub for hubs in labelHubs for hub in hubs), dtype=np.int32, count=int(labelIndptr[-1]))
+        hops = np.fromiter((hop for hops in labelHops for hop in hops), dtype=np.int16, count=int(labelIndptr[-1]))
+        return HopLabels(order, labelIndptr, hubs, hops, time.perf_counter() - began)
+
+    # Exact number of hops between two user indices, -1 when they are not connected
+    def distance(self, a, b):
+        began = time.perf_counter()
+        aBegin, aEnd = self.indptr[a], self.indptr[a + 1]
+        bBegin, bEnd = self.indptr[b], self.indptr[b + 1]
+        common, aHubs, bHubs = np.intersect1d(self.hubs[aBegin:aEnd], self.hubs[bBegin:bEnd], assume_unique=True,
+                                              return_indices=True)
+        hops = int((self.hops[aBegin + aHubs] + self.hops[bBegin + bHubs]).min()) if len(common) else -1
+        self.queries += 1
+        self.queryTime += time.perf_counter() - began
+        return hops
+
+    # Exact number of hops for every (a, b) pair of user indices, -1 where they are not connected
+    def distances(self, pairs):
+        return np.array([self.distance(a, b) for a, b in pairs], dtype=np.int32)
+
+    # Build time, label size and query latency for display
+    def stats(self):
+        users = len(self.indptr) - 1
+        return {"buildTime": self.buildTime, "labels": self.labelCount(),
+                "averageLabel": self.labelCount() / users if users else 0.0, "queries": self.queries,
+                "queryLatency": self.queryTime / self.queries if self.queries else 0.0}
+
+    # Saves the labels as a .npz file. checksum identifies the rel file they were built from
+    def save(self, path, checksum):
+        with open(path, 'wb') as f:
+            np.savez(f, version=HopLabels.VERSION, checksum=checksum, order=self.order, indptr=self.indptr,
+                     hubs=self.hubs, hops=self.hops, build_time=self.buildTime)
+
+    # Loads saved labels. Returns None if there is no file or it was built from a different rel file
+    @staticmethod
+    def load(path, checksum):
+        if not exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != HopLabels.VERSION or str(data["checksum"]) != checksum:
+                return None
+            return HopLabels(data["order"], data["indptr"], data["hubs"], data["hops"], float(data["build_time"]))
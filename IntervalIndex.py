@@ -0,0 +1,50 @@
+import numpy as np
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       IntervalIndex.py answers "which values were active in [start, end]" for one key at a time, where every row is
+#       a (key, value, interval) triple. Rows are grouped by key in compressed sparse row layout and sorted by start
+#       within each key. Together with the longest interval of every key, this bounds the rows that can overlap a
+#       window to one contiguous run found by two binary searches, so a lookup costs O(log n) plus the rows in that
+#       run instead of a scan over all of the key's rows.
+#
+# =====================================================================================================================
+
+
+class IntervalIndex:
+    # keys are ints in the range [0, keyCount), starts and ends are datetime64[D] (or any numpy type with ordering and
+    # subtraction). Intervals include both ends
+    def __init__(self, keyCount, keys, values, starts, ends):
+        keys = np.asarray(keys, dtype=np.int32)
+        starts = np.asarray(starts)
+        ends = np.asarray(ends)
+        order = np.lexsort((starts, keys))
+        self.indptr = np.zeros(keyCount + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=keyCount), out=self.indptr[1:])
+        self.values = np.asarray(values, dtype=np.int32)[order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        # Longest interval of every key. A row of key starting before start - longest[key] ends before start
+        lengths = self.ends - self.starts
+        self.longest = np.zeros(keyCount, dtype=lengths.dtype)
+        np.maximum.at(self.longest, keys[order], lengths)
+
+    # Positions of the rows of key that overlap [start, end]
+    def __rows(self, key, start, end):
+        begin, stop = self.indptr[key], self.indptr[key + 1]
+        starts = self.starts[begin:stop]
+        low = begin + np.searchsorted(starts, start - self.longest[key], side="left")
+        high = begin + np.searchsorted(starts, end, side="right")
+        return low + np.flatnonzero(self.ends[low:high] >= start)
+
+    # Values of the rows of key that overlap [start, end], in order of interval start. A value with several
+    # overlapping rows is repeated
+    def active(self, key, start, end):
+        return self.values[self.__rows(key, start, end)]
+
+    # Number of rows of key that overlap [start, end]
+    def count(self, key, start, end):
+        return len(self.__rows(key, start, end))
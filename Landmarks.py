@@ -0,0 +1,126 @@
+import heapq
+import math
+from os.path import exists
+import numpy as np
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Landmarks.py implements A* point to point routing for road networks. With landmarks (ALT) the heuristic is
+#       the triangle inequality bound max |d(L, t) - d(L, v)| over a set of precomputed landmark distance tables.
+#       The straight line distance between node coordinates is always available as a fallback bound, and plain A*
+#       uses only that.
+#
+# =====================================================================================================================
+
+
+class Landmarks:
+    # Bump whenever the saved format or the landmark selection changes so old files are rebuilt
+    VERSION = 1
+    # Number of landmarks used by a single query. The ones giving the best bound between source and target are used
+    ACTIVE = 4
+
+    # landmarks holds the landmark node indices and table[i] the distances from landmark i to every node
+    def __init__(self, graph, coords, landmarks, table):
+        self.graph = graph
+        self.landmarks = np.asarray(landmarks, dtype=np.int32)
+        self.table = np.asarray(table, dtype=np.float64)
+        # Same table as Python lists for the search loop
+        self.__columns = self.table.tolist()
+        coords = np.asarray(coords, dtype=np.float64)
+        self.__x = coords[:, 0].tolist()
+        self.__y = coords[:, 1].tolist()
+        # Number of nodes settled by the last query, used to compare against the other routing methods
+        self.settled = 0
+        # The straight line bound must never exceed an edge weight. Road weights are close to but not exactly the
+        # euclidean length of the edge, so scale the bound by the smallest weight to length ratio
+        start = np.repeat(np.arange(graph.nodeCount), np.diff(graph.indptr))
+        lengths = np.sqrt(((coords[start] - coords[graph.indices]) ** 2).sum(axis=1))
+        ratios = graph.weights[lengths > 0] / lengths[lengths > 0]
+        self.__scale = min(1.0, float(ratios.min())) if len(ratios) else 1.0
+
+    # Picks landmarks by farthest selection: every new landmark is the node furthest from all landmarks chosen so
+    # far. Nodes no landmark can reach count as infinitely far, so each connected component gets one early on
+    @staticmethod
+    def build(graph, coords, count=16):
+        count = min(count, graph.nodeCount)
+        landmarks = []
+        table = np.empty((count, graph.nodeCount), dtype=np.float64)
+        # Start from the node furthest from node 0 rather than node 0 itself
+        closest = graph.dijkstra(0)
+        closest[np.isinf(closest)] = -1
+        for i in range(count):
+            landmark = int(np.argmax(closest))
+            landmarks.append(landmark)
+            table[i] = graph.dijkstra(landmark)
+            closest = table[i] if i == 0 else np.minimum(closest, table[i])
+        return Landmarks(graph, coords, landmarks, table)
+
+    # A* shortest path distance between two node indices, inf when they are not connected. useLandmarks selects ALT,
+    # otherwise only the straight line bound is used
+    def distance(self, source, target, useLandmarks=True):
+        self.settled = 0
+        if source == target:
+            return 0.0
+        columns = []
+        if useLandmarks:
+            dt = self.table[:, target]
+            ds = self.table[:, source]
+            # A landmark that reaches exactly one of the nodes proves they are in different components
+            if np.any(np.isinf(dt) != np.isinf(ds)):
+                return math.inf
+            # Use the landmarks with the tightest bound at the source, skipping those that cannot reach the target
+            reachable = np.flatnonzero(~np.isinf(dt))
+            gain = np.abs(dt[reachable] - ds[reachable])
+            for i in reachable[np.argsort(-gain)[:self.ACTIVE]]:
+                columns.append((self.__columns[i], float(dt[i])))
+        x, y = self.__x, self.__y
+        tx, ty = x[target], y[target]
+        scale = self.__scale
+
+        # Lower bound on the distance from v to the target: the straight line distance or the landmark
+        # triangle inequality |d(L, t) - d(L, v)|, whichever is larger
+        def bound(v):
+            h = scale * math.hypot(x[v] - tx, y[v] - ty)
+            for column, d in columns:
+                b = abs(d - column[v])
+                if b > h:
+                    h = b
+            return h
+
+        adjacency = self.graph.adjacencyLists()
+        dist = {source: 0.0}
+        closed = set()
+        heap = [(bound(source), source)]
+        while heap:
+            f, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            closed.add(u)
+            self.settled += 1
+            if u == target:
+                return dist[u]
+            du = dist[u]
+            for v, w in adjacency[u]:
+                nd = du + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd + bound(v), v))
+        return math.inf
+
+    # Saves the landmark tables as a .npz file. checksum identifies the edge and node files they were built from
+    def save(self, path, checksum):
+        with open(path, 'wb') as f:
+            np.savez(f, version=Landmarks.VERSION, checksum=checksum, landmarks=self.landmarks, table=self.table)
+
+    # Loads saved landmark tables. Returns None if there is no file or it was built from different edge or node files
+    @staticmethod
+    def load(path, checksum, graph, coords):
+        if not exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != Landmarks.VERSION or str(data["checksum"]) != checksum:
+                return None
+            return Landmarks(graph, coords, data["landmarks"], data["table"])
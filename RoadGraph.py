@@ -0,0 +1,105 @@
+import hashlib
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, breadth_first_order
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       RoadGraph.py is the array-backed road topology used by RoadNetwork. Nodes are dense int32 indices and the
+#       undirected edges are stored once as a compressed sparse row (CSR) adjacency with float32 weights. All
+#       shortest path searches run on these arrays instead of on Python dicts.
+#
+# =====================================================================================================================
+
+
+# Checksum of a file's contents. Files derived from a dataset store it so they can tell when the dataset has changed
+def fileChecksum(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RoadGraph:
+    # start, end and weights are aligned edge arrays. start and end hold node indices in the range [0, nodeCount)
+    def __init__(self, nodeCount, start, end, weights):
+        self.nodeCount = int(nodeCount)
+        start = np.asarray(start, dtype=np.int32)
+        end = np.asarray(end, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float32)
+        # Store both directions of every edge and drop self loops
+        keep = start != end
+        rows = np.concatenate((start[keep], end[keep]))
+        cols = np.concatenate((end[keep], start[keep]))
+        data = np.concatenate((weights[keep], weights[keep]))
+        # Sort by (row, col, weight) so the first copy of a parallel edge is the shortest one, then drop the rest
+        order = np.lexsort((data, cols, rows))
+        rows, cols, data = rows[order], cols[order], data[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows, cols, data = rows[first], cols[first], data[first]
+        indptr = np.zeros(self.nodeCount + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=self.nodeCount), out=indptr[1:])
+        self.__setCSR(indptr, cols, data)
+
+    # Builds a graph straight from CSR arrays, for example ones saved by an earlier session. The arrays may be
+    # read-only memory maps, they are not copied when they already have the right dtype
+    @staticmethod
+    def fromCSR(nodeCount, indptr, indices, weights):
+        graph = RoadGraph.__new__(RoadGraph)
+        graph.nodeCount = int(nodeCount)
+        graph.__setCSR(indptr, indices, weights)
+        return graph
+
+    def __setCSR(self, indptr, indices, weights):
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        # scipy wrapper around the same arrays, no copy is made
+        self.matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(self.nodeCount, self.nodeCount),
+                                 copy=False)
+        self.__adjacency = None
+
+    # Number of directed adjacency entries (twice the number of undirected edges)
+    def edgeCount(self):
+        return len(self.indices)
+
+    # Returns (neighbor indices, weights) of a node as views into the CSR arrays
+    def neighbors(self, node):
+        begin, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[begin:end], self.weights[begin:end]
+
+    # Adjacency as Python lists of (neighbor, weight) pairs. Built on first use for search loops written in Python,
+    # which run much faster over lists than over numpy scalars
+    def adjacencyLists(self):
+        if self.__adjacency is None:
+            indptr = self.indptr.tolist()
+            indices = self.indices.tolist()
+            weights = self.weights.astype(np.float64).tolist()
+            self.__adjacency = [list(zip(indices[indptr[v]:indptr[v + 1]], weights[indptr[v]:indptr[v + 1]]))
+                                for v in range(self.nodeCount)]
+        return self.__adjacency
+
+    # Single source Dijkstra. Returns a float64 array of distances to every node, inf when unreachable
+    def dijkstra(self, source, limit=np.inf):
+        return dijkstra(self.matrix, directed=False, indices=int(source), limit=limit)
+
+    # Point to point shortest path distance, inf when the nodes are not connected
+    def distance(self, source, target):
+        if source == target:
+            return 0.0
+        return float(self.dijkstra(source)[target])
+
+    # Breadth first search. Returns the nodes reachable from source in visiting order
+    def bfs(self, source):
+        return breadth_first_order(self.matrix, int(source), directed=False, return_predecessors=False)
+
+    # Number of hops from source to every node, -1 when unreachable or further than limit hops away
+    def hops(self, source, limit=np.inf):
+        hops = dijkstra(self.matrix, directed=False, indices=int(source), unweighted=True, limit=limit)
+        hops[np.isinf(hops)] = -1
+        return hops.astype(np.int32)
@@ -1,14 +1,19 @@
 import csv
+import hashlib
+import json
 import math
 import random
 import threading
-from os.path import exists
+from os import makedirs, remove
+from os.path import exists, join, splitext
 import numpy as np
 from PyQt5 import QtGui
 from PyQt5.QtGui import QFont
-import networkx as nx
-from functools import partial
-import scipy
+from scipy.spatial import cKDTree
+from RoadGraph import RoadGraph, fileChecksum
+from ContractionHierarchy import ContractionHierarchy
+from Landmarks import Landmarks
+from DistanceCache import DistanceCache
 
 # =====================================================================================================================
 #
@@ -22,102 +27,292 @@ import scipy
 # =====================================================================================================================
 
 
-def find_nearest(points, coord):
-    dist = lambda s, key: (float(s[0]) - float(points[key][0])) ** 2 + (float(s[1]) - float(points[key][1])) ** 2
-    return min(points, key=partial(dist, coord))
-
-
 class RoadNetwork:
-    def __init__(self, name, edgeFile=None, nodeFile=None, POIFile=None, POIKeyFile=None, POIKeyMapFile=None, **kwargs):
+    # Point to point routing methods accepted by setRouting()
+    ROUTING = ["dijkstra", "ch", "alt", "astar"]
+    # Bump whenever the snapshot layout changes so old snapshots are rebuilt
+    SNAPSHOT_VERSION = 2
+
+    def __init__(self, name, edgeFile=None, nodeFile=None, POIFile=None, POIKeyFile=None, POIKeyMapFile=None,
+                 routing="dijkstra", **kwargs):
         self.__name = name
-        self.networkX = nx.Graph()
-        self.__edges = {}
-        self.__nodes = {}
-        self.__POIs = {}
+        self.__edgeFile = edgeFile
+        self.__nodeFile = nodeFile
+        self.graph = None
+        self.routing = "dijkstra"
+        # Number of nodes the last realUserDistance call settled
+        self.settled = 0
+        self.__hierarchy = None
+        self.__landmarks = None
+        self.__checksum = None
+        self.__nodeChecksum = None
+        self.__networkChecksum = None
+        self.distanceCache = None
+        self.__edges = None
+        self.__edgeIndex = {}
+        self.__edgeIds = []
+        self.__edgeLookup = {}
+        self.__edgeStart = None
+        self.__edgeEnd = None
+        self.__edgeWeight = None
+        # Edge weights as written in the edge file, returned by getEdgeDistance()
+        self.__edgeWeightText = []
+        self.__nodeIds = []
+        self.__nodeIndex = {}
+        self.__nodeCoords = None
+        self.__nodeTree = None
+        self.__poiIds = None
+        self.__poiCategories = None
+        self.__poiCoords = None
         self.__keywordMap = {}
         self.__keywords = {}
         self.__flattenedData = [[], []]
         self.__flattenedPOIs = {}
         self.edgeInst = None
         self.POIInst = None
+        # A snapshot from an earlier session replaces parsing the edge, node and POI files
+        fromSnapshot = self.loadSnapshot(nodeFile, POIFile)
         # Create threads for loading files asynchronously
-        threads = [threading.Thread(target=lambda: self.loadEdges(edgeFile)),
-                   threading.Thread(target=lambda: self.loadNodes(nodeFile)),
-                   threading.Thread(target=lambda: self.loadPOIs(POIFile)),
-                   threading.Thread(target=lambda: self.loadKeys(POIKeyFile, POIKeyMapFile))]
+        threads = [threading.Thread(target=lambda: self.loadKeys(POIKeyFile, POIKeyMapFile))]
+        if not fromSnapshot:
+            threads += [threading.Thread(target=lambda: self.loadEdges(edgeFile)),
+                        threading.Thread(target=lambda: self.loadNodes(nodeFile)),
+                        threading.Thread(target=lambda: self.loadPOIs(POIFile))]
         for thread in threads:
             thread.start()
         for thread in threads:
             thread.join()
+        if not fromSnapshot:
+            self.buildGraph()
+            self.saveSnapshot(nodeFile, POIFile)
+        self.openDistanceCache()
         self.flattenData()
         self.flattenPOIs()
+        self.setRouting(routing)
 
-    # Reads edge file from path.
-    # dict = {
-    #    "edge_id": [start_id, end_id, weight],
+    # Reads edge file from path. Edges are kept as columns until buildGraph() turns them into arrays:
+    # edgeIndex = {
+    #    "edge_id": row
     # }
     # noinspection PyShadowingBuiltins
     def loadEdges(self, path=None):
         if path is not None and exists(path):
+            starts = []
+            ends = []
+            weights = []
             with open(path, 'r') as csvFile:
                 reader = csv.reader(csvFile, delimiter=',', quotechar='|')
                 next(reader)
                 for row in reader:
                     edge_id = row[0]
-                    start_id = row[1]
-                    end_id = row[2]
-                    weight = row[3]
-                    if edge_id in self.__edges:
+                    if edge_id in self.__edgeIndex:
                         raise Exception(f"Error: Duplicate value in {path}")
                     else:
-                        self.__edges[edge_id] = [start_id, end_id, weight]
-                        self.networkX.add_edge(float(start_id), float(end_id), weight=float(weight))
+                        self.__edgeIndex[edge_id] = len(starts)
+                        self.__edgeIds.append(edge_id)
+                        starts.append(row[1])
+                        ends.append(row[2])
+                        weights.append(row[3])
+            self.__edges = [starts, ends, weights]
         else:
             self.__edges = None
 
-    # Reads node file from path. This is super awful but it's the fastest way to do things. This is what it returns:
-    # dict = {
-    #    "node_id": [lat, lon]
+    # Reads node file from path. Node ids are kept in file order and node_id's position in that order is the index
+    # used by every array:
+    # nodeIndex = {
+    #    "node_id": index
     # }
+    # nodeCoords = [[lat, lon], [lat, lon]...]
+    # A KD-tree over nodeCoords is built once here and used for every nearest node lookup
     # noinspection PyShadowingBuiltins
     def loadNodes(self, path=None):
         if path is not None and exists(path):
+            coords = []
             with open(path, 'r') as csvFile:
                 reader = csv.reader(csvFile, delimiter=',', quotechar='|')
                 next(reader)
                 for row in reader:
                     node_id = row[0]
-                    lat = row[1]
-                    lon = row[2]
-                    if node_id in self.__nodes:
+                    if node_id in self.__nodeIndex:
                         raise Exception(f"Error: Duplicate value in {path}")
                     else:
-                        self.__nodes[node_id] = [lat, lon]
-                        self.networkX.add_node(float(node_id))
+                        self.__nodeIndex[node_id] = len(self.__nodeIds)
+                        self.__nodeIds.append(node_id)
+                        coords.append((float(row[1]), float(row[2])))
+            self.__nodeCoords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+            self.__nodeTree = cKDTree(self.__nodeCoords)
         else:
-            self.__nodes = None
+            self.__nodeCoords = None
+
+    # Converts the loaded edge columns into int32 endpoint arrays and builds the CSR road graph. Needs both the edge
+    # and node files, so it runs after the loading threads are joined
+    def buildGraph(self):
+        if self.__edges is not None and self.__nodeCoords is not None:
+            starts, ends, weights = self.__edges
+            self.__edgeStart = self.__toNodeIndices(starts)
+            self.__edgeEnd = self.__toNodeIndices(ends)
+            self.__edgeWeightText = weights
+            self.__edgeWeight = np.array(weights, dtype=np.float64).astype(np.float32)
+            self.graph = RoadGraph(len(self.__nodeIds), self.__edgeStart, self.__edgeEnd, self.__edgeWeight)
+            self.buildEdgeLookup()
+        # The string columns are no longer needed once the arrays exist
+        self.__edges = None
 
-    # Reads POI file from path.
-    # dict = {
-    #    "poi_id": [poi_category, lat_pos, lon_pos],
+    def __toNodeIndices(self, nodeIds):
+        indices = np.empty(len(nodeIds), dtype=np.int32)
+        for i, node_id in enumerate(nodeIds):
+            if node_id not in self.__nodeIndex:
+                raise Exception(f"Error: Edge references unknown node {node_id}")
+            indices[i] = self.__nodeIndex[node_id]
+        return indices
+
+    # Packs node index pairs into int64 keys. Edges are undirected so (a, b) and (b, a) share a key
+    @staticmethod
+    def edgeKeys(a, b):
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        return (np.minimum(a, b) << 32) | np.maximum(a, b)
+
+    # Hash index from packed endpoint keys to edge rows:
+    # edgeLookup = {
+    #    (min_node << 32) | max_node: row
     # }
+    # Rows are edge file order, use edgeId() for the edge file id. Where parallel edges join the same nodes the
+    # shortest one is kept, like the road graph does
+    def buildEdgeLookup(self):
+        keys = self.edgeKeys(self.__edgeStart, self.__edgeEnd)
+        # Longest first so the shortest edge is written last and wins
+        order = np.argsort(-self.__edgeWeight, kind="stable")
+        self.__edgeLookup = dict(zip(keys[order].tolist(), order.tolist()))
+
+    # Returns the edge row joining two node indices, -1 when they are not adjacent. O(1), meant for search loops
+    def edgeRow(self, a, b):
+        if a > b:
+            a, b = b, a
+        return self.__edgeLookup.get((int(a) << 32) | int(b), -1)
+
+    # Batched edge lookup. pairs is a list or array of [node index, node index]. Returns an int64 array of edge rows
+    # (-1 where there is no edge) and a float64 array of their weights (nan where there is no edge)
+    def edgesExist(self, pairs):
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        lookup = self.__edgeLookup
+        rows = np.fromiter((lookup.get(key, -1) for key in self.edgeKeys(pairs[:, 0], pairs[:, 1]).tolist()),
+                           dtype=np.int64, count=len(pairs))
+        weights = np.full(len(pairs), np.nan)
+        found = rows >= 0
+        weights[found] = self.__edgeWeight[rows[found]]
+        return rows, weights
+
+    # Returns the edge file id of an edge row
+    def edgeId(self, row):
+        return self.__edgeIds[row]
+
+    # Returns the array index of a node id. Accepts the id as it appears in the node file ("12.0") or as a number
+    def nodeIndex(self, nodeId):
+        if nodeId in self.__nodeIndex:
+            return self.__nodeIndex[nodeId]
+        return self.__nodeIndex[str(float(nodeId))]
+
+    # Returns the node id at an array index
+    def nodeId(self, index):
+        return self.__nodeIds[index]
+
+    # Reads POI file from path into columns, one entry per POI in file order:
+    # poiIds = ["poi_id", "poi_id"...]
+    # poiCategories = ["poi_category", "poi_category"...]
+    # poiCoords = [[lat, lon], [lat, lon]...]
     # noinspection PyShadowingBuiltins
     def loadPOIs(self, path=None):
         if path is not None and exists(path):
+            ids = []
+            categories = []
+            coords = []
+            seen = set()
             with open(path, 'r') as csvFile:
                 reader = csv.reader(csvFile, delimiter=',', quotechar='|')
                 next(reader)
                 for row in reader:
                     poi_id = row[0]
-                    poi_category = row[1]
-                    lat_pos = row[2]
-                    lon_pos = row[3]
-                    if poi_id in self.__POIs:
+                    if poi_id in seen:
                         raise Exception(f"Error: Duplicate value in {path}")
                     else:
-                        self.__POIs[poi_id] = [poi_category, lat_pos, lon_pos]
+                        seen.add(poi_id)
+                        ids.append(poi_id)
+                        categories.append(row[1])
+                        coords.append((float(row[2]), float(row[3])))
+            self.__poiIds = np.array(ids)
+            self.__poiCategories = np.array(categories)
+            self.__poiCoords = np.array(coords, dtype=np.float64).reshape(-1, 2)
         else:
-            self.__POIs = None
+            self.__poiIds = None
+            self.__poiCategories = None
+            self.__poiCoords = None
+
+    # Snapshot directory next to the edge file (<edge file>.snapshot) holding the parsed road network as .npy files
+    def snapshotPath(self):
+        return splitext(self.__edgeFile)[0] + ".snapshot"
+
+    # Checksums of the files a snapshot is built from, stored in its meta.json
+    def __snapshotSources(self, nodeFile, POIFile):
+        return {"version": RoadNetwork.SNAPSHOT_VERSION,
+                "edges": self.edgeChecksum(),
+                "nodes": self.nodeChecksum(),
+                "pois": fileChecksum(POIFile) if POIFile is not None and exists(POIFile) else None}
+
+    # Memory-maps the arrays of a snapshot saved by an earlier session. Returns False, leaving everything unloaded,
+    # when there is no snapshot or the edge, node or POI file changed since it was saved
+    def loadSnapshot(self, nodeFile, POIFile):
+        if self.__edgeFile is None or nodeFile is None or not exists(self.__edgeFile) or not exists(nodeFile):
+            return False
+        path = self.snapshotPath()
+        if not exists(join(path, "meta.json")):
+            return False
+        with open(join(path, "meta.json"), 'r') as f:
+            if json.load(f) != self.__snapshotSources(nodeFile, POIFile):
+                return False
+
+        def array(name):
+            return np.load(join(path, name + ".npy"), mmap_mode='r')
+
+        self.__nodeIds = array("node_ids").tolist()
+        self.__nodeIndex = dict(zip(self.__nodeIds, range(len(self.__nodeIds))))
+        self.__nodeCoords = array("node_coords")
+        self.__nodeTree = cKDTree(self.__nodeCoords)
+        self.__edgeIds = array("edge_ids").tolist()
+        self.__edgeIndex = dict(zip(self.__edgeIds, range(len(self.__edgeIds))))
+        self.__edgeStart = array("edge_start")
+        self.__edgeEnd = array("edge_end")
+        self.__edgeWeight = array("edge_weight")
+        self.__edgeWeightText = array("edge_weight_text").tolist()
+        self.graph = RoadGraph.fromCSR(len(self.__nodeIds), array("indptr"), array("indices"), array("weights"))
+        self.buildEdgeLookup()
+        if POIFile is not None and exists(POIFile):
+            self.__poiIds = array("poi_ids")
+            self.__poiCategories = array("poi_categories")
+            self.__poiCoords = array("poi_coords")
+        return True
+
+    # Saves the parsed road network as a snapshot for later sessions. meta.json is written last, so a snapshot that
+    # was interrupted while saving is never loaded
+    def saveSnapshot(self, nodeFile, POIFile):
+        if self.graph is None:
+            return
+        path = self.snapshotPath()
+        makedirs(path, exist_ok=True)
+        if exists(join(path, "meta.json")):
+            remove(join(path, "meta.json"))
+        arrays = {"node_ids": np.array(self.__nodeIds), "node_coords": self.__nodeCoords,
+                  "edge_ids": np.array(self.__edgeIds), "edge_start": self.__edgeStart, "edge_end": self.__edgeEnd,
+                  "edge_weight": self.__edgeWeight, "edge_weight_text": np.array(self.__edgeWeightText),
+                  "indptr": self.graph.indptr, "indices": self.graph.indices,
+                  "weights": self.graph.weights}
+        if self.__poiIds is not None:
+            arrays.update({"poi_ids": self.__poiIds, "poi_categories": self.__poiCategories,
+                           "poi_coords": self.__poiCoords})
+        for name, values in arrays.items():
+            np.save(join(path, name + ".npy"), values)
+        with open(join(path, "meta.json"), 'w') as f:
+            json.dump(self.__snapshotSources(nodeFile, POIFile), f, indent=4)
 
     # Reads keyword files from path.
     # keywordMap = {
@@ -162,80 +357,159 @@ class RoadNetwork:
             self.__keywordMap = None
             self.__keywords = None
 
+    # Groups the POI coordinates by category into plottable arrays:
+    # flattenedPOIs = {
+    #    "category": [lat array, lon array]
+    # }
+    # A stable sort keeps the POIs of every category in file order
     def flattenPOIs(self):
-        if self.__POIs is not None:
-            for poi in list(self.__POIs.keys()):
-                index = self.__POIs[poi]
-                if index[0] not in list(self.__flattenedPOIs.keys()):
-                    self.__flattenedPOIs[index[0]] = [[float(index[1])], [float(index[2])]]
-                else:
-                    self.__flattenedPOIs[index[0]][0] += [float(index[1])]
-                    self.__flattenedPOIs[index[0]][1] += [float(index[2])]
-
-    # Parses the edge data into instantly plottable lists. For example, lat is [startLat, endLat, None, startLat...]
-    # This also chunks the data for faster processing and dedicates x number of threads to storing that data
+        if self.__poiIds is not None and len(self.__poiIds) > 0:
+            categories, inverse = np.unique(self.__poiCategories, return_inverse=True)
+            coords = self.__poiCoords
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(categories)))[:-1]
+            for category, rows in zip(categories.tolist(), np.split(order, bounds)):
+                self.__flattenedPOIs[category] = [coords[rows, 0], coords[rows, 1]]
+
+    # Builds the edge data as plottable arrays for connect='pairs'. For example, lat is [startLat, endLat, startLat...].
+    # Both are contiguous float64 arrays of length 2E gathered from the node coordinates by edge endpoint
     def flattenData(self):
-        if self.__edges is not None and self.__nodes is not None:
-            threads = []
-            # Used to calculate amount of data in a chunk/thread
-            threadCount = 10
-            total = len(self.__edges)
-            start = 0
-            end = math.floor(total / threadCount)
-            for x in range(1, threadCount + 1):
-                if x == threadCount + 1:
-                    end = total
-                threads.append(threading.Thread(target=lambda s=start, e=end, y=x: self.parseDataChunk(s, e * y)))
-                start = end * x
-            for thread in threads:
-                thread.start()
-            for thread in threads:
-                thread.join()
-
-    # Parses a single chunk of data and adds it to the master list
-    def parseDataChunk(self, start, end):
-        lat = []
-        lon = []
-        edgeList = list(self.__edges)
-        for x in range(start, end):
-            y = edgeList[x]
-            node = self.__edges[y][0]
-            edge = self.__edges[y][1]
-            startLat = float(self.__nodes[node][0])
-            startLon = float(self.__nodes[node][1])
-            endLat = float(self.__nodes[edge][0])
-            endLon = float(self.__nodes[edge][1])
-            lat = lat + [startLat, endLat]
-            lon = lon + [startLon, endLon]
-        self.__flattenedData[0] = self.__flattenedData[0] + lat
-        self.__flattenedData[1] = self.__flattenedData[1] + lon
+        if self.graph is not None:
+            endpoints = np.empty(2 * len(self.__edgeStart), dtype=np.int32)
+            endpoints[0::2] = self.__edgeStart
+            endpoints[1::2] = self.__edgeEnd
+            self.__flattenedData = [np.ascontiguousarray(self.__nodeCoords[endpoints, 0]),
+                                    np.ascontiguousarray(self.__nodeCoords[endpoints, 1])]
 
     def nodeCount(self):
-        return len(list(self.__nodes.keys()))
+        return len(self.__nodeIds)
 
     def closestNode(self, lat, long):
-        tree = scipy.spatial.KDTree(list(self.__nodes.values()))
-        i = tree.query([lat, long])[1]
-        # id = list(self.__nodes.keys())[i]
-        return i
+        i = self.__nodeTree.query([float(lat), float(long)])[1]
+        # id = self.nodeId(i)
+        return int(i)
 
+    # Returns the edge row joining two node ids as a float, None when they are not adjacent or either node is unknown.
+    # Use edgeRow() or edgesExist() for lookups on node indices
     def isAnEdge(self, startId, endId):
-        arr = np.array(list(self.__edges.values()))
-        coords = arr[:, 0:2].tolist()
-        if [startId, endId] in coords:
-            return float(coords.index([startId, endId]))
-        if [endId, startId] in coords:
-            return float(coords.index([endId, startId]))
-        return None
+        if startId not in self.__nodeIndex or endId not in self.__nodeIndex:
+            return None
+        row = self.edgeRow(self.__nodeIndex[startId], self.__nodeIndex[endId])
+        if row < 0:
+            return None
+        return float(row)
 
+    # Returns the weight of an edge id as written in the edge file, raises KeyError for unknown edge ids
     def getEdgeDistance(self, edgeId):
-        return self.__edges[edgeId][2]
+        return self.__edgeWeightText[self.__edgeIndex[edgeId]]
+
+    # Snaps many coordinates to their closest road nodes in one vectorized KD-tree query. coords is a list or array of
+    # [lat, lon] pairs, the result is an int32 array of node indices (use nodeId() to get the node file id)
+    def snapUsers(self, coords):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(coords) == 0:
+            return np.empty(0, dtype=np.int32)
+        return self.__nodeTree.query(coords)[1].astype(np.int32)
 
+    # Returns the id of the road node closest to the user's first location
     def findNearest(self, user):
-        return find_nearest(self.__nodes, (float(user[0][0]), float(user[0][1])))
+        return self.__nodeIds[self.snapUsers([user[0]])[0]]
 
+    # Checksum of the edge file, computed once. Rel files with road distances name the edge file they were routed on
+    def edgeChecksum(self):
+        if self.__checksum is None:
+            self.__checksum = fileChecksum(self.__edgeFile)
+        return self.__checksum
+
+    # Checksum of the node file, computed once
+    def nodeChecksum(self):
+        if self.__nodeChecksum is None:
+            self.__nodeChecksum = fileChecksum(self.__nodeFile)
+        return self.__nodeChecksum
+
+    # Checksum of the edge and node files together. Distances, the contraction hierarchy and the landmark tables are
+    # stored by node position, which the node file decides, so files derived from them use it rather than edgeChecksum()
+    def networkChecksum(self):
+        if self.__networkChecksum is None:
+            checksums = self.edgeChecksum() + self.nodeChecksum()
+            self.__networkChecksum = hashlib.md5(checksums.encode("ascii")).hexdigest()
+        return self.__networkChecksum
+
+    # Opens the road distance cache kept next to the edge file (<edge file>.dist). Distances cached by earlier
+    # sessions are reused as long as the edge and node files are unchanged
+    def openDistanceCache(self):
+        if self.graph is not None:
+            path = splitext(self.__edgeFile)[0] + ".dist"
+            self.distanceCache = DistanceCache(path, self.networkChecksum())
+
+    # Selects how realUserDistance answers point to point queries:
+    #   "dijkstra" - Dijkstra over the CSR road graph
+    #   "ch"       - contraction hierarchy
+    #   "alt"      - A* with landmark (triangle inequality) bounds, falling back to straight line distance
+    #   "astar"    - A* with straight line distance only
+    # The contraction hierarchy and the landmark tables are built the first time they are needed and saved next to
+    # the edge file (<edge file>.ch.npz, <edge file>.alt.npz). Later sessions load them while the edge and node
+    # files are unchanged
+    def setRouting(self, routing):
+        if routing not in self.ROUTING:
+            raise Exception(f"Error: Unknown routing method '{routing}'")
+        if self.graph is not None:
+            if routing == "ch" and self.__hierarchy is None:
+                path = splitext(self.__edgeFile)[0] + ".ch.npz"
+                checksum = self.networkChecksum()
+                self.__hierarchy = ContractionHierarchy.load(path, checksum)
+                if self.__hierarchy is None:
+                    self.__hierarchy = ContractionHierarchy.build(self.graph)
+                    self.__hierarchy.save(path, checksum)
+            if routing in ("alt", "astar") and self.__landmarks is None:
+                path = splitext(self.__edgeFile)[0] + ".alt.npz"
+                checksum = self.networkChecksum()
+                self.__landmarks = Landmarks.load(path, checksum, self.graph, self.__nodeCoords)
+                if self.__landmarks is None:
+                    self.__landmarks = Landmarks.build(self.graph, self.__nodeCoords)
+                    self.__landmarks.save(path, checksum)
+        self.routing = routing
+
+    # Road network distance between two node ids, inf when they are not connected
     def realUserDistance(self, usrA, usrB):
-        return nx.dijkstra_path_length(self.networkX, source=float(usrA), target=float(usrB))
+        source = self.nodeIndex(usrA)
+        target = self.nodeIndex(usrB)
+        distance = self.distanceCache.get(source, target)
+        if distance is not None:
+            self.settled = 0
+            return distance
+        if self.routing == "ch":
+            distance = self.__hierarchy.distance(source, target)
+            self.settled = self.__hierarchy.settled
+        elif self.routing == "alt" or self.routing == "astar":
+            distance = self.__landmarks.distance(source, target, useLandmarks=self.routing == "alt")
+            self.settled = self.__landmarks.settled
+        else:
+            distances = self.graph.dijkstra(source)
+            distance = float(distances[target])
+            # A point to point Dijkstra settles every node that is not further away than the target
+            self.settled = int(np.count_nonzero(distances <= distance))
+        self.distanceCache.put(source, target, distance)
+        return distance
+
+    # Road network distances from one node index to many target node indices. Cached distances are reused and the
+    # rest come from a single Dijkstra, which stops once it is further than cutoff from the source. Targets beyond
+    # the cutoff get inf
+    def distancesFrom(self, source, targets, cutoff=None):
+        if cutoff is None:
+            cutoff = np.inf
+        cutoff = float(cutoff)
+        targets = np.asarray(targets, dtype=np.int32)
+        distances = self.distanceCache.getMany(source, targets)
+        missing = np.isnan(distances)
+        if missing.any():
+            found = self.graph.dijkstra(source, limit=cutoff)[targets[missing]]
+            distances[missing] = found
+            # Past the cutoff inf only means "further than cutoff", so those are not cached
+            exact = ~np.isinf(found) | math.isinf(cutoff)
+            self.distanceCache.putMany(source, targets[missing][exact], found[exact])
+        distances[distances > cutoff] = np.inf
+        return distances
 
     # Visualize the data
     def visualize(self, edgeInst=None, POIInst=None):
@@ -0,0 +1,138 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       SocialGraph.py is the array-backed relation graph used by SocialNetwork. Users are dense int32 indices and
+#       every row of the rel file is one entry of a compressed sparse row (CSR) adjacency with float64 weights. Each
+#       user's relations stay in rel file order. Hop counts and paths treat the relations as undirected and come from a
+#       breadth first search over a symmetric copy of the adjacency, kept as int8 hop arrays when the search is bounded
+#       by at most MAX_HOPS hops and int32 arrays otherwise.
+#
+# =====================================================================================================================
+
+
+class SocialGraph:
+    # Largest limit answered with an int8 hop array, unbounded and larger limits use int32
+    MAX_HOPS = 127
+
+    # start, end and weights are aligned rel arrays, start and end hold user indices in the range [0, userCount).
+    # distances is the optional road distance column of the rel file
+    def __init__(self, userCount, start, end, weights, distances=None):
+        self.userCount = int(userCount)
+        start = np.asarray(start, dtype=np.int32)
+        # Stable sort by user keeps every user's relations in file order
+        order = np.argsort(start, kind="stable")
+        self.indptr = np.zeros(self.userCount + 1, dtype=np.int32)
+        np.cumsum(np.bincount(start, minlength=self.userCount), out=self.indptr[1:])
+        self.indices = np.asarray(end, dtype=np.int32)[order]
+        self.weights = np.asarray(weights, dtype=np.float64)[order]
+        self.distances = None if distances is None else np.asarray(distances, dtype=np.float64)[order]
+        # scipy wrapper around the same arrays, no copy is made
+        self.matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(self.userCount, self.userCount),
+                                 copy=False)
+        # Symmetric adjacency (indptr, indices) for hop searches, built on first use
+        self.__undirected = None
+
+    # Adds a rel entry from a to b after a's other relations, where it would be as the last row of a in the rel file
+    def addEdge(self, a, b, weight, distance=None):
+        position = self.indptr[a + 1]
+        self.indices = np.insert(self.indices, position, b)
+        self.weights = np.insert(self.weights, position, weight)
+        if self.distances is not None:
+            self.distances = np.insert(self.distances, position, np.nan if distance is None else distance)
+        self.indptr[a + 1:] += 1
+        self.__changed()
+
+    # Removes every rel entry from a to b
+    def removeEdge(self, a, b):
+        begin, end = self.indptr[a], self.indptr[a + 1]
+        positions = begin + np.flatnonzero(self.indices[begin:end] == b)
+        self.indices = np.delete(self.indices, positions)
+        self.weights = np.delete(self.weights, positions)
+        if self.distances is not None:
+            self.distances = np.delete(self.distances, positions)
+        self.indptr[a + 1:] -= len(positions)
+        self.__changed()
+
+    # Rewraps the arrays after an edit and drops the symmetric adjacency so it is rebuilt on next use
+    def __changed(self):
+        self.matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(self.userCount, self.userCount),
+                                 copy=False)
+        self.__undirected = None
+
+    # Number of rel entries
+    def edgeCount(self):
+        return len(self.indices)
+
+    # Returns (related user indices, weights) of a user as views into the CSR arrays
+    def neighbors(self, user):
+        begin, end = self.indptr[user], self.indptr[user + 1]
+        return self.indices[begin:end], self.weights[begin:end]
+
+    # Position of the rel entry from a to b in the CSR arrays, -1 when a has no relation to b
+    def edgePosition(self, a, b):
+        begin, end = self.indptr[a], self.indptr[a + 1]
+        found = np.flatnonzero(self.indices[begin:end] == b)
+        return int(begin + found[0]) if len(found) else -1
+
+    # True when either user lists the other as a relation
+    def hasEdge(self, a, b):
+        return self.edgePosition(a, b) >= 0 or self.edgePosition(b, a) >= 0
+
+    # Adjacency with every relation in both directions and each neighbour once, sorted by user
+    def undirected(self):
+        if self.__undirected is None:
+            start = np.repeat(np.arange(self.userCount, dtype=np.int32), np.diff(self.indptr))
+            ends = np.concatenate((self.indices, start))
+            starts = np.concatenate((start, self.indices))
+            both = csr_matrix((np.ones(len(starts), dtype=np.int8), (starts, ends)),
+                              shape=(self.userCount, self.userCount))
+            self.__undirected = (both.indptr, both.indices)
+        return self.__undirected
+
+    # Number of hops from source to every user, -1 when unreachable or further than limit hops away. The array is int8
+    # for limits up to MAX_HOPS and int32 otherwise. The search expands one whole frontier per hop and stops early once
+    # target (when given) has been reached
+    def hops(self, source, limit=None, target=None):
+        indptr, indices = self.undirected()
+        bounded = limit is not None and int(limit) <= self.MAX_HOPS
+        hops = np.full(self.userCount, -1, dtype=np.int8 if bounded else np.int32)
+        hops[source] = 0
+        frontier = np.array([source], dtype=np.int32)
+        # A search cannot go further than userCount - 1 hops
+        limit = self.userCount if limit is None else int(limit)
+        for hop in range(1, limit + 1):
+            if target is not None and hops[target] >= 0:
+                break
+            begins = indptr[frontier]
+            counts = indptr[frontier + 1] - begins
+            total = int(counts.sum())
+            if total == 0:
+                break
+            # Positions of all of the frontier's neighbours, range by range
+            positions = np.repeat(begins - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            neighbors = indices[positions]
+            frontier = np.unique(neighbors[hops[neighbors] < 0])
+            if len(frontier) == 0:
+                break
+            hops[frontier] = hop
+        return hops
+
+    # Fewest hop path from source to target as a list of user indices, [] when they are not connected. Walks back from
+    # target through neighbours one hop closer to source
+    def path(self, source, target, hops=None):
+        if hops is None:
+            hops = self.hops(source, target=target)
+        if hops[target] < 0:
+            return []
+        indptr, indices = self.undirected()
+        path = [int(target)]
+        for hop in range(int(hops[target]) - 1, -1, -1):
+            neighbors = indices[indptr[path[-1]]:indptr[path[-1] + 1]]
+            path.append(int(neighbors[hops[neighbors] == hop][0]))
+        path.reverse()
+        return path
@@ -1,11 +1,21 @@
 import csv
+import hashlib
 import math
 import threading
-from os.path import exists
-import networkx as nx
-from sklearn.cluster import KMeans
-from collections import Counter
+import time
+from functools import lru_cache
+from os.path import exists, splitext
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from dateutil.parser import parse as dateparse
+from SocialGraph import SocialGraph
+from IntervalIndex import IntervalIndex
+from HopLabels import HopLabels
+from Truss import TrussIndex
+from Cores import CoreIndex
+from ClusterPyramid import ClusterPyramid
+from RoadGraph import fileChecksum
 
 # =====================================================================================================================
 #
@@ -20,21 +30,80 @@ from dateutil.parser import parse as dateparse
 
 
 class SocialNetwork:
-    def __init__(self, name, relFile=None, locFile=None, keyFile=None, keyMapFile=None, userDataFile=None, poiFile=None, **kwargs):
+    # Summary clustering methods accepted by setClustering(): cuts of the cluster tree, full batch KMeans,
+    # MiniBatchKMeans, or KMeans started from the centres of the previous summary
+    CLUSTERING = ["pyramid", "kmeans", "minibatch", "warm"]
+    # Seed of every summary clustering so the same network and n always give the same clusters
+    CLUSTER_SEED = 0
+
+    def __init__(self, name, relFile=None, locFile=None, keyFile=None, keyMapFile=None, userDataFile=None, poiFile=None,
+                 clustering="pyramid", **kwargs):
         self.__name = name
-        self.networkX = nx.MultiGraph()
-        self.__rel = {}
+        # CSR relation graph over user indices, built by internUsers()
+        self.graph = None
+        # Optional hop distance labels, built or loaded by buildHopLabels()
+        self.hopLabels = None
+        # Truss decomposition of the relations, built or loaded by buildTruss()
+        self.truss = None
+        # Core numbers of the users, built or loaded by buildCores()
+        self.cores = None
+        # Checksum of the road edge file the rel file distances were computed on, set by loadRel()
+        self.distanceRoad = None
+        self.__relFile = relFile
+        # Set once addRelation() or removeRelation() changed the graph, so indexes saved for the rel file no longer match
+        self.__relationsEdited = False
+        self.__locFile = locFile
+        # Every user gets a dense index the first time any file mentions them. All per-user data below is stored in
+        # lists at that index, external ids ("5352.0") are only used by the public methods
+        self.__userIds = []
+        self.__userIndex = {}
+        self.__rel = None
         self.__loc = {}
         self.__userData = {}
-        self.clusterItems = {}
+        # Summary cluster of every coordinate in chunkedLocData, and the users of every cluster in CSR layout (one entry
+        # per coordinate, clusterUsers[clusterIndptr[c]:clusterIndptr[c + 1]]), set by getSummaryClusters()
+        self.clusterLabels = np.empty(0, dtype=np.int32)
+        self.clusterIndptr = np.zeros(1, dtype=np.int64)
+        self.clusterUsers = np.empty(0, dtype=np.int32)
+        # Summary cluster of the first location of every user, -1 for users without one
+        self.__userCluster = None
+        # Cluster tree over the locations, built or loaded by buildClusterPyramid(), and the summaries already cut
+        # from it by number of clusters
+        self.clusterPyramid = None
+        self.__summaries = {}
+        self.clustering = "pyramid"
+        # Centres and sizes of the last summary, where the warm start begins
+        self.__lastCenters = None
+        self.__lastSizes = None
+        # Method, n, fit time in seconds and inertia of every summary clustering run
+        self.clusterRuns = []
         self.__keywordMap = {}
         self.__keywordMapReverse = {}
         self.__keywords = {}
         self.__keywordTime = {}
+        # Keyword and POI visit times as written in the files, returned by getUserKeywordsTime() and getUserPoiTime()
+        self.__keywordTimeText = {}
+        self.__userPoiTimeText = {}
+        # Inverted keyword index, built by buildKeywordIndex()
+        self.__keywordPostings = {}
+        self.__hasLoc = None
+        # Column of every keyword id in the keyword matrix and time indexes, and the keyword id of every column, built
+        # by buildKeywordIndex()
+        self.__keywordColumn = {}
+        self.__keywordIds = []
+        # Users by keywords and users by POIs incidence matrices, built by buildIncidenceMatrices()
+        self.keywordMatrix = None
+        self.poiMatrix = None
+        # Keyword activity intervals by user and by keyword, built by buildKeywordTimeIndex()
+        self.__keywordTimeByUser = None
+        self.__keywordTimeByKeyword = None
+        self.__poiIds = []
         self.__userPoiTime = {}
+        self.__userPoiVisits = {}
         self.__flattenedRelData = [[], []]
         self.__flattenedLocData = [[], []]
-        self.__chunkedLocData = []
+        self.__chunkedLocData = np.empty((0, 2))
+        self.__chunkedLocUsers = np.empty(0, dtype=np.int32)
         threads = [threading.Thread(target=lambda: self.loadRel(path=relFile)),
                    threading.Thread(target=lambda: self.loadLoc(path=locFile)),
                    threading.Thread(target=lambda: self.loadUser(path=userDataFile)),
@@ -45,11 +114,14 @@ class SocialNetwork:
             thread.start()
         for thread in threads:
             thread.join()
-        self.IDByLoc = self.IDByLoc()
+        self.internUsers()
+        self.buildKeywordIndex()
+        self.buildIncidenceMatrices()
+        self.buildKeywordTimeIndex()
         self.flattenRelData()
         self.flattenLocData()
         self.chunkLocData()
-
+        self.setClustering(clustering)
 
     # Read in user attributes from the given path
     # "USER ID" {
@@ -80,40 +152,64 @@ class SocialNetwork:
 
     def getUserAttributes(self, user_id):
 
-        return self.__userData[user_id]
+        return self.__userData[self.userIndex(user_id)]
 
-    # Reads rel file from path. This is super awful, but it's the fastest way to do things. This is what it returns:
-    # dict = {
-    #    "user_id":
-    #    [
-    #       [rel_user_id, weight],
-    #       [rel_user_id, weight]
-    #    ]
-    # }
+    # Reads rel file from path as columns, one entry per row. internUsers() turns them into the CSR social graph once
+    # every user has an index:
+    # rel = [
+    #    [user_id, user_id...],
+    #    [rel_user_id, rel_user_id...],
+    #    [weight, weight...],
+    #    [distance, distance...]
+    # ]
+    # The distance column only exists in rel files written by UserDistance.loadSocialRel, otherwise it is None.
+    # UserDistance also writes the checksum of the road edge file it routed on to <rel file>.road, which is read into
+    # distanceRoad so the distances are only used for that road network
     # noinspection PyShadowingBuiltins
     def loadRel(self, path=None):
+        self.distanceRoad = None
+        if path is not None and exists(splitext(path)[0] + ".road"):
+            with open(splitext(path)[0] + ".road", 'r') as f:
+                self.distanceRoad = f.read().strip()
         if path is not None and exists(path):
-            dict = {}
+            users = []
+            rels = []
+            weights = []
+            distances = []
             with open(path, 'r') as csvfile:
                 reader = csv.reader(csvfile, delimiter=',', quotechar='|')
-                next(reader)
+                header = next(reader)
+                distanceColumn = header.index("distance") if "distance" in header else None
                 for row in reader:
-                    user_id = row[0]
-                    rel_user_id = row[1]
-                    weight = row[2]
-                    if user_id in dict:
-                        dict[user_id] = dict[user_id] + [[rel_user_id, weight]]
-                    else:
-                        dict[user_id] = [[rel_user_id, weight]]
-                    self.networkX.add_edge(float(user_id), float(rel_user_id), weight=1)
-            self.__rel = dict
+                    users.append(row[0])
+                    rels.append(row[1])
+                    weights.append(float(row[2]))
+                    if distanceColumn is not None:
+                        distances.append(float(row[distanceColumn]))
+            self.__rel = [users, rels, weights, distances if distanceColumn is not None else None]
         else:
             self.__rel = None
 
-    def getUserRel(self, user):
-        return self.__rel[user]
+    # Precomputed road distance between two related users from the rel file, None when they are not related, the rel
+    # file has no distances or road is not the road network UserDistance computed them on
+    def edgeRoadDistance(self, road, u, v):
+        if self.graph is None or self.graph.distances is None or not self.hasDistancesFor(road):
+            return None
+        u = self.__findUser(u)
+        v = self.__findUser(v)
+        if u is None or v is None:
+            return None
+        for a, b in ((u, v), (v, u)):
+            position = self.graph.edgePosition(a, b)
+            if position >= 0:
+                return float(self.graph.distances[position])
+        return None
 
-    # Reads loc file from path.
+    # Whether the rel file distances were computed on road, judged by the checksum of its edge file
+    def hasDistancesFor(self, road):
+        return road is not None and self.distanceRoad is not None and road.edgeChecksum() == self.distanceRoad
+
+    # Reads loc file from path. internUsers() later turns it into a list by user index, None for users without one
     # dict = {
     #    "user_id":
     #    [
@@ -136,7 +232,6 @@ class SocialNetwork:
                         dict[user_id] = dict[user_id] + [lat_pos, lon_pos]
                     else:
                         dict[user_id] = [[lat_pos, lon_pos]]
-                    self.networkX.add_node(float(user_id))
             self.__loc = dict
         else:
             self.__loc = None
@@ -151,6 +246,13 @@ class SocialNetwork:
     #     "user_id": [keyword_id, keyword_id],
     #     "user_id": [keyword_id]
     # }
+    # keywordTime = {
+    #     "user_id": datetime64[D] array([[start, end], [start, end]])
+    # }
+    # keywordTimeText = {
+    #     "user_id": [[start, end], [start, end]]
+    # }
+    # internUsers() later turns keywords and their times into lists by user index
     # noinspection SpellCheckingInspection,PyShadowingBuiltins
     def loadKey(self, kPath=None, mPath=None):
         if kPath is not None and mPath is not None and exists(kPath) and exists(mPath):
@@ -158,6 +260,7 @@ class SocialNetwork:
             keywordsReverse = {}
             userKeywords = {}
             userKeywordsTime = {}
+            times = []
             # Gets key map
             with open(mPath, 'r') as csvfile:
                 reader = csv.reader(csvfile, delimiter=',', quotechar='|')
@@ -177,32 +280,52 @@ class SocialNetwork:
                 for row in reader:
                     user_id = str(float(row[0]))
                     keyword_id = row[1]
-                    if user_id in list(userKeywords.keys()):
+                    times.append([row[2], row[3]])
+                    if user_id in userKeywords:
                         userKeywords[user_id].append(keyword_id)
-                        userKeywordsTime[user_id].append([row[2], row[3]])
+                        userKeywordsTime[user_id].append(len(times) - 1)
                     else:
                         userKeywords[user_id] = [keyword_id]
-                        userKeywordsTime[user_id] = ([row[2], row[3]])
+                        userKeywordsTime[user_id] = [len(times) - 1]
+            # Every time is parsed once here, each user gets the (start, end) rows of their keywords
+            days = self.parseDays(times).reshape(-1, 2)
             self.__keywordMap = keywords
             self.__keywordMapReverse = keywordsReverse
             self.__keywords = userKeywords
-            self.__keywordTime = userKeywordsTime
+            self.__keywordTime = {user: days[rows] for user, rows in userKeywordsTime.items()}
+            self.__keywordTimeText = {user: [times[row] for row in rows] for user, rows in userKeywordsTime.items()}
         else:
             self.__keywordMap = None
             self.__keywordMapReverse = None
             self.__keywords = None
             self.__keywordTime = None
+            self.__keywordTimeText = None
 
+    # Reads POI visits from path.
+    # userPoiTime = {
+    #     "user_id": {"poi_id": datetime64[D] array([time, time])}
+    # }
+    # userPoiVisits = {
+    #     "user_id": (["poi_id", "poi_id", ...], datetime64[D] array([time, time, ...]))
+    # }
+    # userPoiTimeText = {
+    #     "user_id": {"poi_id": [time, time]}
+    # }
+    # userPoiVisits lists every visit of a user, POI by POI, so time windows are one mask over the times. The arrays of
+    # userPoiTime are views into the same times. userPoiTimeText keeps the times as written in the file
+    # noinspection PyShadowingBuiltins
     def loadPoi(self, path=None):
         if path is not None and exists(path):
             dict = {}
+            times = []
             with open(path, 'r') as csvfile:
                 reader = csv.reader(csvfile, delimiter=',', quotechar='|')
                 next(reader)
                 for row in reader:
                     user = str(row[0])  # Convert user to string
                     poi = str(row[1])  # Convert poi to string
-                    time = row[2]
+                    times.append(row[2])
+                    time = len(times) - 1
                     if user in dict:
                         if poi in dict[user]:
                             dict[user][poi].append(time)
@@ -210,16 +333,219 @@ class SocialNetwork:
                             dict[user][poi] = [time]
                     else:
                         dict[user] = {poi: [time]}  # Create new dictionary entry
+            text = {user: {poi: [times[row] for row in poiRows] for poi, poiRows in pois.items()}
+                    for user, pois in dict.items()}
+            times = self.parseDays(times)
+            visits = {}
+            for user, pois in dict.items():
+                rows = [row for poiRows in pois.values() for row in poiRows]
+                visits[user] = ([poi for poi, poiRows in pois.items() for _ in poiRows], times[rows])
+                offset = 0
+                for poi, poiRows in pois.items():
+                    pois[poi] = visits[user][1][offset:offset + len(poiRows)]
+                    offset += len(poiRows)
             self.__userPoiTime = dict
+            self.__userPoiVisits = visits
+            self.__userPoiTimeText = text
         else:
             self.__userPoiTime = None
+            self.__userPoiVisits = None
+            self.__userPoiTimeText = None
+
+    # Parses a list of time strings into a datetime64[D] array. Times of day are dropped. ISO 8601 times
+    # ("2020-01-17", "2020-01-17T10:30:00") are parsed in one go; when any time is in another format every time goes
+    # through dateutil one by one, as windowDays() does. Times neither can parse raise ValueError
+    @staticmethod
+    def parseDays(times):
+        try:
+            return np.array(times, dtype="datetime64[s]").astype("datetime64[D]")
+        except ValueError:
+            times = np.array(times, dtype=str)
+            days = [np.datetime64(dateparse(time)).astype("datetime64[D]") for time in times.ravel().tolist()]
+            return np.array(days, dtype="datetime64[D]").reshape(times.shape)
+
+    # First and last day of a time window, as datetime64[D]. Times in the files are whole days, so a start part way
+    # through a day leaves that day out while an end part way through a day keeps it. Bounds are parsed once per
+    # window rather than once per comparison
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def windowDays(start, end):
+        start = np.datetime64(dateparse(str(start)))
+        end = np.datetime64(dateparse(str(end)))
+        startDay = start.astype("datetime64[D]")
+        if startDay < start:
+            startDay += np.timedelta64(1, "D")
+        return startDay, end.astype("datetime64[D]")
+
+    # Returns the dense index of a user. Accepts the id as it appears in the files ("12.0") or as a number
+    def userIndex(self, userId):
+        if userId in self.__userIndex:
+            return self.__userIndex[userId]
+        return self.__userIndex[str(float(userId))]
+
+    # Returns the external id of a user index
+    def userId(self, index):
+        return self.__userIds[index]
+
+    def userCount(self):
+        return len(self.__userIds)
+
+    # Same as userIndex() but returns None for unknown users
+    def __findUser(self, userId):
+        try:
+            return self.userIndex(userId)
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    # Gives a user id the next dense index, or returns the one it already has. Ids are stored as str(float(id)), the
+    # spelling the rel and loc files use, and the spelling found in the file is remembered as an alias
+    def __intern(self, userId):
+        index = self.__userIndex.get(userId)
+        if index is None:
+            canonical = str(float(userId))
+            index = self.__userIndex.get(canonical)
+            if index is None:
+                index = len(self.__userIds)
+                self.__userIds.append(canonical)
+                self.__userIndex[canonical] = index
+            self.__userIndex[userId] = index
+        return index
+
+    # Moves a dict keyed by user id into a list by user index. Users the dict has no entry for get None
+    def __byIndex(self, data):
+        result = [None] * len(self.__userIds)
+        for user, value in data.items():
+            result[self.__userIndex[user]] = value
+        return result
+
+    # Assigns dense indices to every user once all files are loaded, always in the same order: users with a location
+    # first (in loc file order), then users only found in the rel, keyword, user data and POI files. The loaded dicts
+    # are then replaced by lists indexed by user and the rel columns by the CSR social graph
+    def internUsers(self):
+        if self.__loc is not None:
+            for user in self.__loc:
+                self.__intern(user)
+        if self.__rel is not None:
+            users, rels, weights, distances = self.__rel
+            start = [self.__intern(user) for user in users]
+            end = [self.__intern(user) for user in rels]
+        for data in (self.__keywords, self.__userData, self.__userPoiTime):
+            if data is not None:
+                for user in data:
+                    self.__intern(user)
+        if self.__rel is not None:
+            self.graph = SocialGraph(len(self.__userIds), start, end, weights, distances)
+            # The string columns are no longer needed once the graph exists
+            self.__rel = None
+        if self.__loc is not None:
+            self.__loc = self.__byIndex(self.__loc)
+        if self.__keywords is not None:
+            self.__keywords = [keywords or [] for keywords in self.__byIndex(self.__keywords)]
+            self.__keywordTime = [np.empty((0, 2), dtype="datetime64[D]") if times is None else times
+                                  for times in self.__byIndex(self.__keywordTime)]
+            self.__keywordTimeText = [times or [] for times in self.__byIndex(self.__keywordTimeText)]
+        if self.__userData is not None:
+            self.__userData = self.__byIndex(self.__userData)
+        if self.__userPoiTime is not None:
+            self.__userPoiTime = self.__byIndex(self.__userPoiTime)
+            self.__userPoiVisits = self.__byIndex(self.__userPoiVisits)
+            self.__userPoiTimeText = self.__byIndex(self.__userPoiTimeText)
+
+    # Builds the inverted keyword index. Every keyword id maps to the sorted user indices that have it:
+    # keywordPostings = {
+    #    "keyword_id": array([user, user...])
+    # }
+    # hasLoc marks the users with a location, the only ones keyword searches return.
+    # Also numbers the keyword ids (key map order first), which are the columns of the keyword matrix and time indexes
+    def buildKeywordIndex(self):
+        self.__hasLoc = np.zeros(len(self.__userIds), dtype=bool)
+        if self.__loc is not None:
+            self.__hasLoc[[user for user, locs in enumerate(self.__loc) if locs is not None]] = True
+        postings = {}
+        self.__keywordColumn = {keyword: column for column, keyword in enumerate(self.__keywordMap or {})}
+        if self.__keywords is not None:
+            for user, keywords in enumerate(self.__keywords):
+                for keyword in keywords:
+                    postings.setdefault(keyword, []).append(user)
+                    self.__keywordColumn.setdefault(keyword, len(self.__keywordColumn))
+        self.__keywordIds = list(self.__keywordColumn)
+        # Users are visited in index order, so every postings list is already sorted and only needs deduplicating
+        self.__keywordPostings = {keyword: np.unique(np.array(users, dtype=np.int32))
+                                  for keyword, users in postings.items()}
+
+    # Builds the sparse incidence matrices used by the common keyword and POI queries. Entry (user, column) is 1 when
+    # the user has that keyword or has visited that POI. Keyword columns follow keywordColumn, POI columns are
+    # in order of first appearance
+    def buildIncidenceMatrices(self):
+        users = []
+        columns = []
+        if self.__keywords is not None:
+            for user, keywords in enumerate(self.__keywords):
+                users += [user] * len(keywords)
+                columns += [self.__keywordColumn[keyword] for keyword in keywords]
+        self.keywordMatrix = self.__incidence(users, columns, len(self.__keywordIds))
+        poiColumn = {}
+        users = []
+        columns = []
+        if self.__userPoiTime is not None:
+            for user, pois in enumerate(self.__userPoiTime):
+                for poi in pois or {}:
+                    users.append(user)
+                    columns.append(poiColumn.setdefault(poi, len(poiColumn)))
+        self.__poiIds = list(poiColumn)
+        self.poiMatrix = self.__incidence(users, columns, len(self.__poiIds))
+
+    # 0/1 users by columns CSR matrix with a 1 at every (users[i], columns[i])
+    def __incidence(self, users, columns, width):
+        matrix = csr_matrix((np.ones(len(users), dtype=np.int32), (np.array(users, dtype=np.int32),
+                            np.array(columns, dtype=np.int32))), shape=(len(self.__userIds), width))
+        # Repeated entries were summed by the conversion
+        matrix.data[:] = 1
+        matrix.sort_indices()
+        return matrix
+
+    # Indexes every (user, keyword, [start_time, end_time]) row of the keyword file twice, by user and by keyword, so
+    # both "keywords active for a user" and "users with a keyword active" in a time window are binary searches
+    def buildKeywordTimeIndex(self):
+        users = []
+        keywords = []
+        if self.__keywords is not None:
+            for user, userKeywords in enumerate(self.__keywords):
+                users += [user] * len(userKeywords)
+                keywords += [self.__keywordColumn[keyword] for keyword in userKeywords]
+            times = np.concatenate(self.__keywordTime) if self.__keywordTime else np.empty((0, 2), "datetime64[D]")
+        else:
+            times = np.empty((0, 2), dtype="datetime64[D]")
+        self.__keywordTimeByUser = IntervalIndex(len(self.__userIds), users, keywords, times[:, 0], times[:, 1])
+        self.__keywordTimeByKeyword = IntervalIndex(len(self.__keywordIds), keywords, users, times[:, 0], times[:, 1])
+
+    # Sorted user indices that have every keyword in keywords. The postings are intersected smallest first, each step
+    # binary searching the remaining candidates in the next postings, so the cost follows the smallest postings
+    # rather than the number of users
+    def usersWithKeywordIndices(self, keywords):
+        if not keywords:
+            return np.arange(len(self.__userIds), dtype=np.int32)
+        postings = []
+        for keyword in set(keywords):
+            if keyword not in self.__keywordPostings:
+                return np.empty(0, dtype=np.int32)
+            postings.append(self.__keywordPostings[keyword])
+        postings.sort(key=len)
+        result = postings[0]
+        for users in postings[1:]:
+            if len(result) == 0:
+                break
+            pos = np.searchsorted(users, result)
+            pos[pos == len(users)] = 0
+            result = result[users[pos] == result]
+        return result
 
     # Parses the rel data into instantly plottable lists. For example, lat is [startLat, endLat, None, startLat...]
     # This also chunks the data for faster processing and dedicates x number of threads to storing that data.
     def flattenRelData(self):
-        if self.__rel is not None and self.__loc is not None:
+        if self.graph is not None and self.__loc is not None:
             threads = []
-            total = len(self.__rel)
+            total = self.graph.userCount
             threadCount = 10
             start = 0
             end = math.floor(total / threadCount)
@@ -239,20 +565,18 @@ class SocialNetwork:
         # TODO: Include weight
         lat = []
         lon = []
-        relList = list(self.__rel)
-        for x in range(start, end):
-            y = relList[x]
-            rels = self.__rel[y]
-            if y in self.__loc:
-                locs = self.__loc[y]
+        for y in range(start, end):
+            rels = self.graph.neighbors(y)[0].tolist()
+            locs = self.__loc[y]
+            if locs is not None:
                 for z in locs:
                     startLat = float(z[0])
                     startLon = float(z[1])
                     for a in rels:
-                        if a[0] in self.__loc:
-                            for b in range(0, len(self.__loc[a[0]])):
-                                endLat = float(self.__loc[a[0]][b][0])
-                                endLon = float(self.__loc[a[0]][b][1])
+                        if self.__loc[a] is not None:
+                            for b in range(0, len(self.__loc[a])):
+                                endLat = float(self.__loc[a][b][0])
+                                endLon = float(self.__loc[a][b][1])
                                 lat = lat + [startLat, endLat]
                                 lon = lon + [startLon, endLon]
         self.__flattenedRelData[0] = self.__flattenedRelData[0] + lat
@@ -281,46 +605,29 @@ class SocialNetwork:
     def parseLocDataChunk(self, start, end):
         lat = []
         lon = []
-        locList = list(self.__loc)
-        for x in range(start, end):
-            y = locList[x]
+        for y in range(start, end):
             locs = self.__loc[y]
+            if locs is None:
+                continue
             for z in range(0, len(locs)):
                 lat = lat + [float(locs[z][0])]
                 lon = lon + [float(locs[z][1])]
         self.__flattenedLocData[0] = self.__flattenedLocData[0] + lat
         self.__flattenedLocData[1] = self.__flattenedLocData[1] + lon
 
-    # Chunks coords from [[lat, lat, lat...],[lon, lon, lon...]] to [[lat, lon], [lat lon]...]
+    # Chunks coords from [[lat, lat, lat...],[lon, lon, lon...]] to [[lat, lon], [lat lon]...]. chunkedLocUsers holds
+    # the user index of every coordinate so cluster labels map straight back to users
     def chunkLocData(self):
         if self.__loc is not None:
-            threads = []
-            total = len(self.__loc)
-            threadCount = 10
-            start = 0
-            end = math.floor(total / threadCount)
-            for x in range(1, threadCount + 1):
-                if x == threadCount + 1:
-                    end = total
-                threads.append(
-                    threading.Thread(target=lambda s=start, e=end, y=x: self.parseChunkLocChunk(s, e * y)))
-                start = end * x
-            for thread in threads:
-                thread.start()
-            # for thread in threads:
-            #    thread.join()
-
-    # Parses a single chunk of data and adds it to the master list
-    # noinspection SpellCheckingInspection
-    def parseChunkLocChunk(self, start, end):
-        coords = []
-        locList = list(self.__loc)
-        for x in range(start, end):
-            y = locList[x]
-            locs = self.__loc[y]
-            for z in range(0, len(locs)):
-                coords = coords + [[float(locs[z][0]), float(locs[z][1])]]
-        self.__chunkedLocData = self.__chunkedLocData + coords
+            coords = []
+            users = []
+            for user, locs in enumerate(self.__loc):
+                if locs is not None:
+                    for loc in locs:
+                        coords.append([float(loc[0]), float(loc[1])])
+                        users.append(user)
+            self.__chunkedLocData = np.array(coords, dtype=np.float64).reshape(-1, 2)
+            self.__chunkedLocUsers = np.array(users, dtype=np.int32)
 
     def getFlattenedLocData(self):
         return self.__flattenedLocData
@@ -328,16 +635,6 @@ class SocialNetwork:
     def getChunkedLocData(self):
         return self.__chunkedLocData
 
-    def IDByLoc(self):
-        temp = {}
-        for id in self.__loc:
-            for loc in self.__loc[id]:
-                temp[f'{loc}'] = id
-        return temp
-
-    def getIDByLoc(self, lat, lon):
-        return self.IDByLoc[f"['{lat}', '{lon}']"]
-
     # Returns all keywords
     def getKeywords(self):
         return list(self.__keywordMap.values())
@@ -348,94 +645,267 @@ class SocialNetwork:
     def getKeywordByID(self, id):
         return str(self.__keywordMap[id])
 
+    # Users with a location that have every keyword id in keywords, in loc file order. With no keywords, returns the
+    # users that have no keywords at all
     def getUsersWithKeywords(self, keywords):
-        matches = []
-        for user in list(self.__loc.keys()):
-            if keywords:
-                match = True
-                for keyword in keywords:
-                    if user not in self.__keywords or keyword not in self.__keywords[user]:
-                        match = False
-                        break
-                if not match:
-                    continue
-                matches.append(user)
-            else:
-                if user not in self.__keywords:
-                    matches.append(user)
-        return matches
+        if keywords:
+            users = self.usersWithKeywordIndices(keywords)
+        else:
+            users = np.flatnonzero([not keywords for keywords in self.__keywords])
+        return [self.__userIds[user] for user in users[self.__hasLoc[users]].tolist()]
 
     def getUser(self, userID):
-        return [userID, self.__loc[userID]]
+        return [userID, self.__loc[self.userIndex(userID)]]
 
     def getUserKeywords(self, userID):
-        if userID in self.__keywords:
-            return self.__keywords[userID]
+        user = self.__findUser(userID)
+        if user is not None and self.__keywords is not None:
+            return self.__keywords[user]
         else:
             return []
 
+    # POI visits of a user, raises KeyError when the POI file has none for them
+    def __userPois(self, userID):
+        pois = self.__userPoiTime[self.userIndex(userID)]
+        if pois is None:
+            raise KeyError(userID)
+        return pois
+
     def getUserPoi(self, userID):
-        return self.__userPoiTime[userID].keys()
+        return self.__userPois(userID).keys()
     
+    # Keywords of a user active at any time between start and end, each once, in order of the time they became active
+    def getUserKeywordsActive(self, userID, start, end):
+        user = self.__findUser(userID)
+        if user is None:
+            return []
+        start, end = self.windowDays(start, end)
+        active = self.__keywordTimeByUser.active(user, start, end).tolist()
+        return [self.__keywordIds[keyword] for keyword in dict.fromkeys(active)]
+
+    # Users with a keyword active at any time between start and end, each once
+    def getUsersWithKeywordActive(self, keyword, start, end):
+        column = self.__keywordColumn.get(keyword)
+        if column is None:
+            return []
+        start, end = self.windowDays(start, end)
+        active = self.__keywordTimeByKeyword.active(column, start, end).tolist()
+        return [self.__userIds[user] for user in dict.fromkeys(active)]
+
+    # POIs visited between start and end, once per visit
     def getUserPoiInTime(self, userID, start, end):
-        pois = []
-        for poi in self.__userPoiTime[userID]:
-            for time in self.__userPoiTime[userID][poi]:
-                if dateparse(time) >= dateparse(start) and dateparse(time) <= dateparse(end):
-                    pois.append(poi)
-                    continue
-        return pois
-    
+        visits = self.__userPoiVisits[self.userIndex(userID)]
+        if visits is None:
+            raise KeyError(userID)
+        pois, times = visits
+        start, end = self.windowDays(start, end)
+        return [pois[visit] for visit in np.flatnonzero((times >= start) & (times <= end)).tolist()]
+
+    # Keywords of a user whose start time is between start and end
     def getUserKeywordsInTime(self, userID, start, end):
-        keywordsTemp = self.getUserKeywords(userID)
-        keywords = []
-        for keyword in keywordsTemp:
-            if dateparse(self.__keywordTime[userID][self.__keywords[userID].index(keyword)][0]) >= dateparse(start) and dateparse(self.__keywordTime[userID][self.__keywords[userID].index(keyword)][0]) <= dateparse(end):
-                keywords.append(keyword)
-        return keywords
-    
+        user = self.__findUser(userID)
+        if user is None or self.__keywords is None:
+            return []
+        start, end = self.windowDays(start, end)
+        times = self.__keywordTime[user][:, 0]
+        keywords = self.__keywords[user]
+        return [keywords[i] for i in np.flatnonzero((times >= start) & (times <= end)).tolist()]
+
+    # Visit times of a POI as written in the POI file
     def getUserPoiTime(self, userID, poi):
-        return self.__userPoiTime[userID][poi]
-    
+        pois = self.__userPoiTimeText[self.userIndex(userID)]
+        if pois is None:
+            raise KeyError(userID)
+        return pois[poi]
+
+    # [start, end] of a user's keyword as written in the keyword file
     def getUserKeywordsTime(self, userID, keyword):
-        return self.__keywordTime[userID][self.__keywords[userID].index(keyword)]
+        user = self.userIndex(userID)
+        return self.__keywordTimeText[user][self.__keywords[user].index(keyword)]
 
+    # Returns [[rel_user_id, weight], ...] for a user in rel file order, [] when the user has no relations
     def getUserRel(self, user):
         res = []
-        try:
-            res = self.__rel[user]
-        except KeyError:
-            res = []
+        user = self.__findUser(user)
+        if user is not None and self.graph is not None:
+            rels, weights = self.graph.neighbors(user)
+            res = [[self.__userIds[rel], weight] for rel, weight in zip(rels.tolist(), weights.tolist())]
         return res
 
 
     def getUsers(self):
-        return list(self.__loc.keys())
+        return [self.__userIds[user] for user, locs in enumerate(self.__loc) if locs is not None]
 
     def userLoc(self, userID):
-        return self.__loc[userID]
+        return self.__loc[self.userIndex(userID)]
 
+    # Number of hops between two users over the relations, -1 when they are not connected
     def numberOfHops(self, start, end):
-        hops = 0
-        try:
-            hops = nx.dijkstra_path_length(self.networkX, float(start), float(end))
-        except (nx.NetworkXNoPath, nx.NodeNotFound) as e:
-            hops = -1
-        #return self.networkX.number_of_edges(float(start), float(end))
-        return hops
+        start = self.__findUser(start)
+        end = self.__findUser(end)
+        if start is None or end is None or self.graph is None:
+            return -1
+        if self.hopLabels is not None:
+            return self.hopLabels.distance(start, end)
+        return int(self.graph.hops(start, target=end)[end])
+
+    # Number of hops for every (start, end) pair of user ids, -1 where they are not connected. Answered from the hop
+    # labels when they are built, otherwise with one search per distinct start user
+    def hopsBetween(self, pairs):
+        result = np.full(len(pairs), -1, dtype=np.int32)
+        if self.graph is None:
+            return result
+        pairs = [(self.__findUser(start), self.__findUser(end)) for start, end in pairs]
+        searches = {}
+        for i, (start, end) in enumerate(pairs):
+            if start is None or end is None:
+                continue
+            if self.hopLabels is not None:
+                result[i] = self.hopLabels.distance(start, end)
+            else:
+                if start not in searches:
+                    searches[start] = self.graph.hops(start)
+                result[i] = searches[start][end]
+        return result
+
+    # Adds a relation between two known users in both directions, as if rows for it were appended to the rel file.
+    # The truss decomposition and core numbers, when built, are updated around the new relation. Hop labels are
+    # dropped since they cannot be updated in place
+    def addRelation(self, user, other, weight=1.0, distance=None):
+        a, b = self.__relationUsers(user, other)
+        if self.cores is not None:
+            self.cores.track(self.graph)
+        for start, end in ((a, b), (b, a)):
+            if self.graph.edgePosition(start, end) < 0:
+                self.graph.addEdge(start, end, weight, distance)
+        if self.truss is not None:
+            self.truss.insertEdge(a, b)
+        if self.cores is not None:
+            self.cores.insertEdge(a, b)
+        self.hopLabels = None
+        self.__relationsEdited = True
 
+    # Removes the relation between two users in both directions and updates the truss decomposition and core numbers
+    # around it
+    def removeRelation(self, user, other):
+        a, b = self.__relationUsers(user, other)
+        if self.cores is not None:
+            self.cores.track(self.graph)
+        self.graph.removeEdge(a, b)
+        self.graph.removeEdge(b, a)
+        if self.truss is not None:
+            self.truss.deleteEdge(a, b)
+        if self.cores is not None:
+            self.cores.deleteEdge(a, b)
+        self.hopLabels = None
+        self.__relationsEdited = True
+
+    def __relationUsers(self, user, other):
+        a = self.__findUser(user)
+        b = self.__findUser(other)
+        if a is None or b is None or self.graph is None:
+            raise Exception(f"Error: Unknown user in relation ({user}, {other})")
+        return a, b
+
+    # Loads an index over the relations from <rel file><suffix> when it was saved for the same rel file, otherwise
+    # builds and saves it. index is HopLabels, TrussIndex or CoreIndex. Once relations were edited the graph no longer
+    # matches the rel file, so the index is built in memory only
+    def __relIndex(self, index, suffix):
+        if self.__relationsEdited:
+            return index.build(self.graph)
+        path = splitext(self.__relFile)[0] + suffix
+        checksum = fileChecksum(self.__relFile)
+        result = index.load(path, checksum)
+        if result is None:
+            result = index.build(self.graph)
+            result.save(path, checksum)
+        return result
+
+    # Builds the pruned landmark labels that answer numberOfHops() and hopsBetween() without searching the graph, or
+    # loads them from <rel file>.hops.npz when they were saved for the same rel file
+    def buildHopLabels(self):
+        if self.graph is not None:
+            self.hopLabels = self.__relIndex(HopLabels, ".hops.npz")
+
+    # Builds the k-core decomposition of the relations, or loads it from <rel file>.cores.npz when it was saved for the
+    # same rel file
+    def buildCores(self):
+        if self.graph is not None and self.cores is None:
+            self.cores = self.__relIndex(CoreIndex, ".cores.npz")
+
+    # Core number of a user, the largest k for which they are in the k-core. 0 for unknown users
+    def coreNumber(self, user):
+        user = self.__findUser(user)
+        if user is None or self.graph is None:
+            return 0
+        self.buildCores()
+        return int(self.cores.cores[user])
+
+    # Users in users with a core number of at least k, in the same order. Community queries use this to skip users
+    # that cannot be part of a cohesive enough community before scoring them
+    def usersWithCore(self, users, k):
+        if k <= 0 or self.graph is None:
+            return list(users)
+        self.buildCores()
+        result = []
+        for user in users:
+            index = self.__findUser(user)
+            if index is not None and self.cores.cores[index] >= k:
+                result.append(user)
+        return result
+
+    # Builds the truss decomposition of the relations, or loads it from <rel file>.truss.npz when it was saved for the
+    # same rel file
+    def buildTruss(self):
+        if self.graph is not None and self.truss is None:
+            self.truss = self.__relIndex(TrussIndex, ".truss.npz")
+
+    # Maximal connected k-truss containing the query user, as (user ids, [[user id, user id], ...] relations). Every
+    # relation in it is part of at least k - 2 triangles inside it
+    def trussCommunity(self, queryUser, k=3):
+        query = self.__findUser(queryUser)
+        if query is None or self.graph is None:
+            return [], []
+        self.buildTruss()
+        users, edges = self.truss.community(query, k)
+        relations = [[self.__userIds[start], self.__userIds[end]]
+                     for start, end in zip(self.truss.start[edges].tolist(), self.truss.end[edges].tolist())]
+        return [self.__userIds[user] for user in users.tolist()], relations
+
+    # Users in users that are in the query user's k-truss community, and the largest k-truss each of them is in
+    def usersWithinTruss(self, queryUser, users, k=3):
+        withinTruss = []
+        trussDetails = {}
+        query = self.__findUser(queryUser)
+        if query is not None and self.graph is not None:
+            self.buildTruss()
+            community = set(self.truss.community(query, k)[0].tolist())
+            best = self.truss.userTrussness()
+            for user in users:
+                index = self.__findUser(user)
+                if index in community:
+                    withinTruss.append(user)
+                    trussDetails[user] = int(best[index])
+        return withinTruss, trussDetails
+
+    # Returns the user ids on a fewest hop path between two users, [] when they are not connected
     def shortestPath(self, start, end):
-        path = []
-        try: 
-            path = nx.dijkstra_path(self.networkX, float(start), float(end))
-        except (nx.NetworkXNoPath, nx.NodeNotFound) as e:
-            path = []
-        return path
+        start = self.__findUser(start)
+        end = self.__findUser(end)
+        if start is None or end is None or self.graph is None:
+            return []
+        return [self.__userIds[user] for user in self.graph.path(start, end)]
 
     def commonRelations(self, target, users):
         result = []
+        target = self.__findUser(target)
+        if target is None or self.graph is None:
+            return result
+        # Users related to target in either direction
+        related = set(self.graph.neighbors(target)[0].tolist())
         for user in users:
-            if self.networkX.has_edge(user,target):
+            index = self.__findUser(user)
+            if index is not None and (index in related or self.graph.edgePosition(index, target) >= 0):
                 result.append(user)
         return result
 
@@ -451,91 +921,177 @@ class SocialNetwork:
     # Returns size for cluster icons so that clusters that contain fewer nodes are smaller
     @staticmethod
     def sizeSort(refs):
-        sizes = []
-        refsSorted = refs.copy()
-        refsSorted.sort()
-        for x in refs:
-            sizes += [((refsSorted.index(x) + 1) * (75 / len(refsSorted)))]
-        return sizes
+        refsSorted = np.sort(refs)
+        # Rank of the first equal size, so clusters of the same size get the same icon
+        return ((np.searchsorted(refsSorted, refs) + 1) * (75 / len(refsSorted))).tolist()
+
+    # Builds the cluster tree the summary view is cut from, or loads it from <loc file>.clusters.npz when it was saved
+    # for the same locations
+    def buildClusterPyramid(self):
+        if self.clusterPyramid is None and len(self.__chunkedLocData):
+            checksum = hashlib.md5(self.__chunkedLocData.tobytes()).hexdigest()
+            path = splitext(self.__locFile)[0] + ".clusters.npz"
+            self.clusterPyramid = ClusterPyramid.load(path, checksum)
+            if self.clusterPyramid is None:
+                self.clusterPyramid = ClusterPyramid.build(self.__chunkedLocData)
+                self.clusterPyramid.save(path, checksum)
 
+    # Changes the method getSummaryClusters() uses
+    def setClustering(self, clustering):
+        if clustering not in self.CLUSTERING:
+            raise Exception(f"Error: Unknown clustering method '{clustering}'")
+        self.clustering = clustering
+
+    # Summary of the locations as n clusters made with the current clustering method, cached by method and n. Returns
+    # the cluster ids, their centres, icon sizes, the lines between every two centres and the number of locations in
+    # each cluster. A cut of the cluster tree gives at most ClusterPyramid.LEAVES clusters, more are made with KMeans
     def getSummaryClusters(self, n):
         n = int(n)
         if n < 1:
             n = 10
-        # n_clusters is th number of nodes to plot
-        kmeans = KMeans(n_clusters=int(n))
-        chunkedData = self.getChunkedLocData()
-        kmeans.fit(chunkedData)
-        # Scales the nodes according to population
-        centers = kmeans.cluster_centers_
-        # Get items in clusters and put it into dictionary {'clusterid': [userid, userid...], ...}
-        self.clusterItems = {}
-        for i in range(0, len(chunkedData)):
-            label = kmeans.labels_[i]
-            userid = self.getIDByLoc(chunkedData[i][0], chunkedData[i][1])
-            if label in self.clusterItems:
-                self.clusterItems[label].append(userid)
+        coords = self.__chunkedLocData
+        n = min(n, len(coords))
+        method = self.clustering
+        if method == "pyramid":
+            self.buildClusterPyramid()
+            if n > self.clusterPyramid.leafCount:
+                method = "kmeans"
+        key = (method, n)
+        if key not in self.__summaries:
+            began = time.perf_counter()
+            order = None
+            if method == "pyramid":
+                pyramid = self.clusterPyramid
+                nodes = pyramid.cut(n)
+                centers = pyramid.centers[nodes]
+                order = pyramid.order
+                labels = np.empty(len(order), dtype=np.int32)
+                labels[order] = np.repeat(np.arange(n, dtype=np.int32), pyramid.ends[nodes] - pyramid.starts[nodes])
+                inertia = float(((coords - centers[labels]) ** 2).sum())
             else:
-                self.clusterItems[label] = [userid]
-        clusterStart = list(self.clusterItems.keys())
-        popSize = []
-        for x in self.clusterItems:
-            if isinstance(self.clusterItems[x], list):
-                popSize.append(len(self.clusterItems[x]))
-        relations = [[], []]
-        while len(clusterStart) != 1:
-            start = clusterStart[0]
-            for item in clusterStart:
-                if clusterStart[0] is not item:
-                    relations[0] += [centers[start][0], centers[item][0]]
-                    relations[1] += [centers[start][1], centers[item][1]]
-                    # for user in clusterItems[start]:
-                    #    for user2 in clusterItems[start]:
-                    #        print(f"    {user}")
-            clusterStart.pop(0)
-        ref = list(Counter(kmeans.labels_).values())
-        sizes = self.sizeSort(ref)
-        ids = list(self.clusterItems.keys())
-
-        return ids, centers, sizes, relations, popSize
-
-    # Return the cluster id for a given user
+                kmeans = self.__kmeans(n, method).fit(coords)
+                centers = kmeans.cluster_centers_
+                labels = kmeans.labels_.astype(np.int32)
+                inertia = float(kmeans.inertia_)
+            self.clusterRuns.append({"clustering": method, "n": n, "fitTime": time.perf_counter() - began,
+                                     "inertia": inertia})
+            ids = list(range(n))
+            popSize = np.bincount(labels, minlength=n).tolist()
+            # A line between every two centres, as consecutive point pairs
+            start, item = np.triu_indices(n, 1)
+            relations = [np.column_stack((centers[start, 0], centers[item, 0])).ravel().tolist(),
+                         np.column_stack((centers[start, 1], centers[item, 1])).ravel().tolist()]
+            sizes = self.sizeSort(popSize)
+            self.__summaries[key] = (labels, order, (ids, centers, sizes, relations, popSize))
+        labels, order, summary = self.__summaries[key]
+        self.__setClusters(labels, n, order)
+        self.__lastCenters = summary[1]
+        self.__lastSizes = summary[4]
+        return summary
+
+    # Unfitted KMeans model for n summary clusters with the given clustering method
+    def __kmeans(self, n, method):
+        if method == "minibatch":
+            return MiniBatchKMeans(n_clusters=n, random_state=self.CLUSTER_SEED, n_init=3)
+        if method == "warm" and self.__lastCenters is not None:
+            # Keep the centres of the n largest previous clusters. When there were fewer, add locations with
+            # probability proportional to their squared distance from the closest centre so far, as k-means++ does
+            coords = self.__chunkedLocData
+            keep = np.argsort(self.__lastSizes, kind="stable")[::-1][:n]
+            init = [center for center in self.__lastCenters[np.sort(keep)]]
+            rng = np.random.default_rng(self.CLUSTER_SEED)
+            closest = np.min([((coords - center) ** 2).sum(axis=1) for center in init], axis=0)
+            while len(init) < n:
+                total = closest.sum()
+                location = rng.choice(len(coords), p=closest / total) if total > 0 else rng.integers(len(coords))
+                init.append(coords[location])
+                closest = np.minimum(closest, ((coords - coords[location]) ** 2).sum(axis=1))
+            init = np.array(init)
+            return KMeans(n_clusters=n, init=init, n_init=1, random_state=self.CLUSTER_SEED)
+        return KMeans(n_clusters=n, random_state=self.CLUSTER_SEED)
+
+    # Stores the cluster label of every coordinate in chunkedLocData and groups the coordinates' users by cluster.
+    # order, when given, already lists the coordinates grouped by cluster
+    def __setClusters(self, labels, clusterCount, order=None):
+        labels = np.asarray(labels, dtype=np.int32)
+        users = self.__chunkedLocUsers
+        if order is None:
+            order = np.argsort(labels, kind="stable")
+        self.clusterLabels = labels
+        self.clusterIndptr = np.zeros(clusterCount + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=clusterCount), out=self.clusterIndptr[1:])
+        self.clusterUsers = users[order]
+        # Reversed so that the first location of a user is written last and wins
+        self.__userCluster = np.full(len(self.__userIds), -1, dtype=np.int32)
+        self.__userCluster[users[::-1]] = labels[::-1]
+
+    # Return the cluster id for a given user, -1 when they have no location or no clusters were made yet
     def getUserCluster(self, user):
-        for x in self.clusterItems:
-            if user in self.clusterItems[x]:
-                return x
-        return -1
-    
+        user = self.__findUser(user)
+        if user is None or self.__userCluster is None:
+            return -1
+        return int(self.__userCluster[user])
+
+    # User ids of a cluster, once per location of the user in it
     def getClusterUsers(self, cluster):
-        return self.clusterItems[cluster]
-    
+        users = self.clusterUsers[self.clusterIndptr[cluster]:self.clusterIndptr[cluster + 1]]
+        return [self.__userIds[user] for user in users.tolist()]
+
+    # Users with a location sharing at least k keywords with the query user, and the shared keyword ids of each
     def usersCommonKeyword(self, queryUser, k=1):
-        commonUsers = []
-        commonDetails = {}
-        if queryUser is not None:
-            users = self.getUsers()
-            for user in users:
-                if user is not queryUser:
-                    common = list(set(self.getUserKeywords(user)).intersection(
-                        self.getUserKeywords(queryUser)))
-                    if len(common) > (k-1):
-                        commonDetails[user] = common
-                        commonUsers.append(user)
-        return commonUsers, commonDetails
-    
+        return self.usersCommonKeywordMany([queryUser], k)[0]
+
+    # usersCommonKeyword() for many query users at once
+    def usersCommonKeywordMany(self, queryUsers, k=1):
+        return self.__usersCommon(self.keywordMatrix, self.__keywordIds, queryUsers, k)
+
+    # Users with a location that visited at least k of the POIs the query user visited, and the shared POI ids of each
     def usersCommonPoi(self, queryUser, k=1):
-        commonUsers = []
-        commonDetails = {}
-        if queryUser is not None:
-            users = self.getUsers()
-            for user in users:
-                if user is not queryUser:
-                    common = list(set(self.getUserPoi(user)).intersection(
-                        self.getUserPoi(queryUser)))
-                    if len(common) > (k-1):
-                        commonDetails[user] = common
-                        commonUsers.append(user)
-        return commonUsers, commonDetails
+        return self.usersCommonPoiMany([queryUser], k)[0]
+
+    # usersCommonPoi() for many query users at once
+    def usersCommonPoiMany(self, queryUsers, k=1):
+        return self.__usersCommon(self.poiMatrix, self.__poiIds, queryUsers, k)
+
+    # Counts the items every user shares with the query users from the incidence matrix. One query user is a sparse
+    # matrix vector product with their row, several are one sparse matrix product with all of their rows. Returns a
+    # (commonUsers, commonDetails) pair per query user, ids of columns are looked up in columnIds
+    def __usersCommon(self, matrix, columnIds, queryUsers, k):
+        results = []
+        queries = [None if user is None else self.__findUser(user) for user in queryUsers]
+        known = [query for query in queries if query is not None]
+        if len(known) == 1:
+            counts = {known[0]: matrix @ matrix[known[0]].toarray()[0]}
+        elif known:
+            product = (matrix @ matrix[known].T).tocsc()
+            counts = {}
+            for column, query in enumerate(known):
+                counts[query] = np.zeros(matrix.shape[0], dtype=np.int32)
+                begin, end = product.indptr[column], product.indptr[column + 1]
+                counts[query][product.indices[begin:end]] = product.data[begin:end]
+        for queryUser, query in zip(queryUsers, queries):
+            commonUsers = []
+            commonDetails = {}
+            if queryUser is None:
+                results.append((commonUsers, commonDetails))
+                continue
+            # Unknown users have no items, which only matters when k < 1
+            shared = np.zeros(matrix.shape[0], dtype=np.int32) if query is None else counts[query]
+            users = np.flatnonzero(self.__hasLoc & (shared > (k - 1)))
+            users = users[users != (-1 if query is None else query)]
+            # Keep the entries of the matched users' rows that are also in the query user's row
+            rows = matrix[users]
+            inQuery = np.zeros(matrix.shape[1], dtype=bool)
+            if query is not None:
+                inQuery[matrix.indices[matrix.indptr[query]:matrix.indptr[query + 1]]] = True
+            keep = inQuery[rows.indices]
+            kept = np.concatenate(([0], np.cumsum(keep))).tolist()
+            columns = rows.indices[keep].tolist()
+            for user, begin, end in zip(users.tolist(), rows.indptr[:-1].tolist(), rows.indptr[1:].tolist()):
+                commonUsers.append(self.__userIds[user])
+                commonDetails[self.__userIds[user]] = [columnIds[column] for column in columns[kept[begin]:kept[end]]]
+            results.append((commonUsers, commonDetails))
+        return results
 
     def usersCommonPoiTime(self, queryUser, poi, start, end, k=1):
         commonUsers = []
@@ -551,11 +1107,27 @@ class SocialNetwork:
                         commonUsers.append(user)
         return commonUsers, commonDetails
     
+    # Hops from a user to every user index from a single breadth first search, -1 when unreachable or further than h
+    # hops (h=None searches the whole graph). int8 when h is at most SocialGraph.MAX_HOPS, otherwise int32. All -1 for
+    # unknown users
+    def hopArray(self, queryUser, h=None):
+        query = self.__findUser(queryUser)
+        if query is None or self.graph is None:
+            return np.full(len(self.__userIds), -1, dtype=np.int8)
+        return self.graph.hops(query, h)
+
+    # Hop distance of a user read from a hopArray()
+    def hopsIn(self, hops, user):
+        user = self.__findUser(user)
+        return -1 if user is None else int(hops[user])
+
+    # Users in users within h hops of the query user (every user when h is 0) and their hop counts
     def usersWithinHops(self, queryUser, users, h=0):
         withinHops = []
         hopsDetails = {}
+        hopArray = self.hopArray(queryUser, None if h == 0 else h)
         for user in users:
-            hops = self.numberOfHops(queryUser, user)
+            hops = self.hopsIn(hopArray, user)
             if h == 0:
                 withinHops.append(user)
                 hopsDetails[user] = hops
@@ -565,22 +1137,34 @@ class SocialNetwork:
                     hopsDetails[user] = hops
         return withinHops, hopsDetails
 
-    # Returns users within d distance
+    # Road network distance from the query user to each user in users. All users are snapped to the road network in
+    # one batch and the distances come from a single search that stops after d
+    def roadDistances(self, road, query, users, d=None):
+        queryNode = road.snapUsers([self.userLoc(query)[0]])[0]
+        userNodes = road.snapUsers([self.userLoc(user)[0] for user in users])
+        return road.distancesFrom(queryNode, userNodes, cutoff=d)
+
+    # Returns users within d distance. Distances to direct friends come from the rel file when it was made for road,
+    # only the other users are routed on the road network
     def usersWithinDistance(self, road, query, users, d=2):
         withinDistance = []
         distDetails = {}
-        common = self.userLoc(query)
-        commonLoc = road.findNearest(common)
-        for user in users:
-            query = self.userLoc(user)
-            queryLoc = road.findNearest(query)
-            dist = road.realUserDistance(queryLoc, commonLoc)
+        distances = np.full(len(users), np.nan)
+        if self.hasDistancesFor(road):
+            for i, user in enumerate(users):
+                distance = self.edgeRoadDistance(road, query, user)
+                if distance is not None:
+                    distances[i] = distance
+        rest = np.flatnonzero(np.isnan(distances))
+        if len(rest):
+            distances[rest] = self.roadDistances(road, query, [users[i] for i in rest], d=d)
+        for user, dist in zip(users, distances):
             if dist <= d:
                 withinDistance.append(user)
-                distDetails[user] = dist
+                distDetails[user] = float(dist)
         return withinDistance, distDetails
     
     def userKeywordTime(self, user, keyword):
         keywords = self.getUserKeywords(user)
         i = keywords.index(str(keyword))
-        return self.__keywordTime[user][i]
+        return self.__keywordTimeText[self.userIndex(user)][i]
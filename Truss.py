@@ -0,0 +1,290 @@
+import time
+from os.path import exists
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Truss.py is the truss decomposition of a social graph. The support of a relation is the number of triangles
+#       it is part of, counted for every relation at once with one sparse matrix product. Relations are then peeled in
+#       order of support, always removing the least supported one and lowering the support of the two other sides of
+#       each of its triangles. The trussness of a relation is the largest k for which it belongs to the k-truss, the
+#       largest subgraph where every relation is in at least k - 2 triangles.
+#
+#       Adding or removing one relation changes the trussness of other relations by at most one, and only of
+#       relations linked to it through a chain of triangles that share relations of the same trussness. Updates peel
+#       just those relations, level by level, and give the same result as decomposing the whole graph again.
+#
+# =====================================================================================================================
+
+
+class TrussIndex:
+    # Bump whenever the saved format or the decomposition changes so old files are rebuilt
+    VERSION = 1
+
+    # start and end are the two users of every undirected relation (start < end) and trussness its truss number
+    def __init__(self, userCount, start, end, trussness, buildTime=0.0):
+        self.userCount = int(userCount)
+        self.start = np.asarray(start, dtype=np.int32)
+        self.end = np.asarray(end, dtype=np.int32)
+        self.trussness = np.asarray(trussness, dtype=np.int32)
+        # Seconds spent on the decomposition, kept when the index is saved
+        self.buildTime = float(buildTime)
+        # Neighbour sets and {(start, end): trussness} for updates, built on the first update
+        self.__neighbors = None
+        self.__edgeTruss = None
+
+    # Number of undirected relations
+    def edgeCount(self):
+        return len(self.start)
+
+    # Undirected 0/1 adjacency of a SocialGraph without self relations
+    @staticmethod
+    def adjacency(graph):
+        indptr, indices = graph.undirected()
+        adjacency = csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                               shape=(graph.userCount, graph.userCount))
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+        return adjacency
+
+    # Decomposes a SocialGraph
+    @staticmethod
+    def build(graph):
+        began = time.perf_counter()
+        adjacency = TrussIndex.adjacency(graph)
+        # Triangles through every relation: common neighbours of its two users
+        support = (adjacency @ adjacency).multiply(adjacency).tocsr()
+        rows = np.repeat(np.arange(graph.userCount, dtype=np.int32), np.diff(adjacency.indptr))
+        keep = rows < adjacency.indices
+        start, end = rows[keep], adjacency.indices[keep]
+        # Fancy indexing a sparse matrix with empty arrays gives a sparse matrix rather than values
+        if len(start) == 0:
+            return TrussIndex(graph.userCount, start, end, [], time.perf_counter() - began)
+        edgeSupport = np.asarray(support[start, end]).ravel().astype(np.int64)
+        trussness = TrussIndex.__peel(graph.userCount, start, end, edgeSupport)
+        return TrussIndex(graph.userCount, start, end, trussness, time.perf_counter() - began)
+
+    # Peels relations in order of support with bucket sorted arrays, so lowering a support is a constant time swap
+    @staticmethod
+    def __peel(userCount, start, end, support):
+        m = len(start)
+        start = start.tolist()
+        end = end.tolist()
+        support = support.tolist()
+        edgeOf = [{} for _ in range(userCount)]
+        for e in range(m):
+            edgeOf[start[e]][end[e]] = e
+            edgeOf[end[e]][start[e]] = e
+        # order holds relations sorted by support, bins[s] is where support s starts in order, pos the inverse
+        maxSupport = max(support, default=0)
+        counts = [0] * (maxSupport + 2)
+        for s in support:
+            counts[s + 1] += 1
+        bins = [0] * (maxSupport + 2)
+        for s in range(1, maxSupport + 2):
+            bins[s] = bins[s - 1] + counts[s]
+        order = [0] * m
+        pos = [0] * m
+        fill = bins[:]
+        for e in range(m):
+            pos[e] = fill[support[e]]
+            order[pos[e]] = e
+            fill[support[e]] += 1
+        trussness = [0] * m
+        for i in range(m):
+            e = order[i]
+            level = support[e]
+            trussness[e] = level + 2
+            u, v = start[e], end[e]
+            if len(edgeOf[u]) > len(edgeOf[v]):
+                u, v = v, u
+            for w, f in edgeOf[u].items():
+                g = edgeOf[v].get(w)
+                if g is None:
+                    continue
+                for side in (f, g):
+                    s = support[side]
+                    if s > level:
+                        # Swap side with the first relation of its bin and shrink the bin from the left
+                        first = bins[s]
+                        other = order[first]
+                        order[first], order[pos[side]] = side, other
+                        pos[other], pos[side] = pos[side], first
+                        bins[s] += 1
+                        support[side] = s - 1
+            del edgeOf[u][v]
+            del edgeOf[v][u]
+        return trussness
+
+    # Relation key with the smaller user first
+    @staticmethod
+    def key(a, b):
+        return (a, b) if a < b else (b, a)
+
+    def __prepare(self):
+        if self.__neighbors is None:
+            self.__neighbors = [set() for _ in range(self.userCount)]
+            self.__edgeTruss = {}
+            for a, b, truss in zip(self.start.tolist(), self.end.tolist(), self.trussness.tolist()):
+                self.__neighbors[a].add(b)
+                self.__neighbors[b].add(a)
+                self.__edgeTruss[(a, b)] = truss
+
+    # Relations of trussness k linked to the seed relations through triangles whose relations all have trussness k
+    # or more (the relation being added counts as any trussness). Only these can change at level k
+    def __candidates(self, seeds, k, added=None):
+        truss = self.__edgeTruss
+        candidates = {edge for edge in seeds if edge == added or truss[edge] == k}
+        queue = list(candidates)
+        while queue:
+            x, y = queue.pop()
+            for w in self.__neighbors[x] & self.__neighbors[y]:
+                f, g = self.key(x, w), self.key(y, w)
+                if (f == added or truss[f] >= k) and (g == added or truss[g] >= k):
+                    for edge in (f, g):
+                        if edge not in candidates and edge != added and truss[edge] == k:
+                            candidates.add(edge)
+                            queue.append(edge)
+        return candidates
+
+    # Peels candidates with fewer than need triangles. Relations outside candidates count as present when their
+    # trussness is at least keep. Returns the candidates that survive
+    def __peelCandidates(self, candidates, need, keep):
+        truss = self.__edgeTruss
+        alive = set(candidates)
+
+        def present(edge):
+            return edge in alive or (edge not in candidates and truss.get(edge, 0) >= keep)
+
+        support = {}
+        for x, y in candidates:
+            support[(x, y)] = sum(1 for w in self.__neighbors[x] & self.__neighbors[y]
+                                  if present(self.key(x, w)) and present(self.key(y, w)))
+        queue = [edge for edge in candidates if support[edge] < need]
+        while queue:
+            edge = queue.pop()
+            if edge not in alive:
+                continue
+            x, y = edge
+            for w in self.__neighbors[x] & self.__neighbors[y]:
+                f, g = self.key(x, w), self.key(y, w)
+                if present(f) and present(g):
+                    for other in (f, g):
+                        if other in alive:
+                            support[other] -= 1
+                            if support[other] < need:
+                                queue.append(other)
+            alive.discard(edge)
+        return alive
+
+    # Adds the relation between users a and b and updates the trussness of the relations around it
+    def insertEdge(self, a, b):
+        self.__prepare()
+        added = self.key(a, b)
+        if a == b or added in self.__edgeTruss:
+            return
+        self.__neighbors[a].add(b)
+        self.__neighbors[b].add(a)
+        truss = self.__edgeTruss
+        common = self.__neighbors[a] & self.__neighbors[b]
+        changes = {}
+        addedTruss = 2
+        k = 2
+        while True:
+            # The new relation needs k - 1 triangles with both other sides in the k-truss to reach the (k + 1)-truss
+            if sum(1 for w in common if truss[self.key(a, w)] >= k and truss[self.key(b, w)] >= k) < k - 1:
+                break
+            candidates = self.__candidates([added], k, added)
+            survivors = self.__peelCandidates(candidates, k - 1, k + 1)
+            if added not in survivors:
+                break
+            addedTruss = k + 1
+            for edge in survivors:
+                if edge != added:
+                    changes[edge] = k + 1
+            k += 1
+        truss.update(changes)
+        truss[added] = addedTruss
+        position = np.searchsorted(self.__keys(), (added[0] << 32) | added[1])
+        self.start = np.insert(self.start, position, added[0])
+        self.end = np.insert(self.end, position, added[1])
+        self.trussness = np.insert(self.trussness, position, addedTruss)
+        self.__write(changes)
+
+    # Removes the relation between users a and b and updates the trussness of the relations around it
+    def deleteEdge(self, a, b):
+        self.__prepare()
+        removed = self.key(a, b)
+        if removed not in self.__edgeTruss:
+            return
+        truss = self.__edgeTruss
+        common = self.__neighbors[a] & self.__neighbors[b]
+        self.__neighbors[a].discard(b)
+        self.__neighbors[b].discard(a)
+        removedTruss = truss.pop(removed)
+        changes = {}
+        for k in range(3, removedTruss + 1):
+            seeds = [edge for w in common for edge in (self.key(a, w), self.key(b, w))
+                     if truss[self.key(a, w)] >= k and truss[self.key(b, w)] >= k]
+            candidates = self.__candidates(seeds, k)
+            for edge in candidates - self.__peelCandidates(candidates, k - 2, k):
+                changes[edge] = k - 1
+        truss.update(changes)
+        position = np.searchsorted(self.__keys(), (removed[0] << 32) | removed[1])
+        self.start = np.delete(self.start, position)
+        self.end = np.delete(self.end, position)
+        self.trussness = np.delete(self.trussness, position)
+        self.__write(changes)
+
+    # Relations packed as start << 32 | end, in the sorted order of the arrays
+    def __keys(self):
+        return (self.start.astype(np.int64) << 32) | self.end.astype(np.int64)
+
+    # Copies changed trussness values into the arrays
+    def __write(self, changes):
+        if changes:
+            edges = np.array(list(changes), dtype=np.int64).reshape(-1, 2)
+            positions = np.searchsorted(self.__keys(), (edges[:, 0] << 32) | edges[:, 1])
+            self.trussness[positions] = list(changes.values())
+
+    # Largest k for which the user is in the k-truss, 0 for users without relations
+    def userTrussness(self):
+        best = np.zeros(self.userCount, dtype=np.int32)
+        np.maximum.at(best, self.start, self.trussness)
+        np.maximum.at(best, self.end, self.trussness)
+        return best
+
+    # Maximal connected k-truss containing user, as (user indices, relation indices). Empty when the user has no
+    # relation with trussness k or more
+    def community(self, user, k):
+        edges = np.flatnonzero(self.trussness >= k)
+        start, end = self.start[edges], self.end[edges]
+        if not (np.any(start == user) or np.any(end == user)):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        graph = csr_matrix((np.ones(len(edges), dtype=np.int8), (start, end)), shape=(self.userCount, self.userCount))
+        labels = connected_components(graph, directed=False)[1]
+        inCommunity = labels[start] == labels[user]
+        users = np.unique(np.concatenate((start[inCommunity], end[inCommunity])))
+        return users, edges[inCommunity]
+
+    # Saves the index as a .npz file. checksum identifies the rel file it was built from
+    def save(self, path, checksum):
+        with open(path, 'wb') as f:
+            np.savez(f, version=TrussIndex.VERSION, checksum=checksum, user_count=self.userCount, start=self.start,
+                     end=self.end, trussness=self.trussness, build_time=self.buildTime)
+
+    # Loads a saved index. Returns None if there is no file or it was built from a different rel file
+    @staticmethod
+    def load(path, checksum):
+        if not exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != TrussIndex.VERSION or str(data["checksum"]) != checksum:
+                return None
+            return TrussIndex(int(data["user_count"]), data["start"], data["end"], data["trussness"],
+                              float(data["build_time"]))
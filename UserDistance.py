@@ -1,23 +1,22 @@
 import csv
 import csv
-from os.path import exists
+from os.path import exists, splitext
 import networkx as nx
-from functools import partial
+from scipy.spatial import cKDTree
+from RoadGraph import fileChecksum
 
 
-def find_nearest(points, coord):
-    dist = lambda s, key: (s[0] - points[key][0]) ** 2 + \
-                           (s[1] - points[key][1]) ** 2
-    return min(points, key=partial(dist, coord))
-    
-
 class UserDistance:
     def __init__(self):
         self.network = nx.Graph()
         self.__nodes = {}
+        self.__nodeIds = []
+        self.__nodeTree = None
         self.__loc = {}
         self.__keywords = {}
         self.relRemoved = 0
+        # Checksum of the edge file the distances are routed on, written next to every rel file made here
+        self.__edgeChecksum = None
 
         #
         # INSTRUCTIONS:
@@ -47,6 +46,7 @@ class UserDistance:
     def loadRoadEdges(self, path=None):
         
         if path is not None and exists(path):
+            self.__edgeChecksum = fileChecksum(path)
             dict = {}
             with open(path, 'r') as csvfile:
                 reader = csv.reader(csvfile, delimiter=',', quotechar='|')
@@ -87,6 +87,9 @@ class UserDistance:
                         self.network.add_node(float(node_id))
                         dict[node_id] = (float(lat), float(lon))
             self.__nodes = dict
+            # KD-tree used to snap users to their closest road node
+            self.__nodeIds = list(dict.keys())
+            self.__nodeTree = cKDTree(list(dict.values()))
         else:
             self.__nodes = None
 
@@ -109,6 +112,10 @@ class UserDistance:
                 
                 # Add header to output file
                 writer.writerow(['user_id','rel_user_id','weight','distance','keywords'])
+                # Snap every user to their closest road node with one batched KD-tree query
+                users = list(self.__loc.keys())
+                snapped = self.__nodeTree.query([[float(self.__loc[user][0][0]), float(self.__loc[user][0][1])] for user in users])[1]
+                nearest = {user: self.__nodeIds[i] for user, i in zip(users, snapped)}
                 next(reader)
                 for row in reader:
                     user_id = row[0]
@@ -123,12 +130,15 @@ class UserDistance:
                         self.relRemoved = self.relRemoved + 1
                         continue
 
-                    usrA = find_nearest(self.__nodes, (float(self.__loc[user_id][0][0]), float(self.__loc[user_id][0][1])))
-                    usrB = find_nearest(self.__nodes, (float(self.__loc[rel_user_id][0][0]), float(self.__loc[rel_user_id][0][1])))
+                    usrA = nearest[user_id]
+                    usrB = nearest[rel_user_id]
                     commonKeywords= len(set(self.__keywords[user_id]) & set(self.__keywords[rel_user_id]))
                     row.append(nx.dijkstra_path_length(self.network, source=float(usrA), target=float(usrB)))
                     row.append(commonKeywords)
                     writer.writerow(row)
+            # Record which road network the distances were routed on, SocialNetwork only uses them for that one
+            with open(splitext(name)[0] + ".road", 'w') as roadObj:
+                roadObj.write(self.__edgeChecksum)
 
     # Reads loc file from path.
     # dict = {
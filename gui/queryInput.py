@@ -21,7 +21,7 @@ class QueryInput:
         return keywords
     
     def getCommunityResponse(self):
-        return self.queryWindow.kcTextBox.value(), self.queryWindow.dTextBox.text(), self.queryWindow.eTextBox.text(), self.queryWindow.kTextBox.text(), self.queryWindow.rTextBox.text(), self.queryWindow.pTextBox.text()
+        return self.queryWindow.kcTextBox.value(), self.queryWindow.dTextBox.text(), self.queryWindow.eTextBox.text(), self.queryWindow.kTextBox.text(), self.queryWindow.rTextBox.text(), self.queryWindow.pTextBox.text(), self.queryWindow.cTextBox.value()
 
     def getCommunityTimeResponse(self):
         return (self.queryWindow.kcTextBox.value(), 
@@ -31,10 +31,11 @@ class QueryInput:
                 self.queryWindow.rTextBox.text(), 
                 self.queryWindow.pTextBox.text(), 
                 self.queryWindow.tSTextBox.date().toString("yyyy-MM-dd"), 
-                self.queryWindow.tETextBox.date().toString("yyyy-MM-dd"))
+                self.queryWindow.tETextBox.date().toString("yyyy-MM-dd"),
+                self.queryWindow.cTextBox.value())
 
     def getKdResponse(self):
-        return self.queryWindow.kTextBox.value(), self.queryWindow.dTextBox.text(), self.queryWindow.eTextBox.text()
+        return self.queryWindow.kTextBox.value(), self.queryWindow.dTextBox.text(), self.queryWindow.eTextBox.text(), self.queryWindow.cTextBox.value()
     
     def kdQuery(self):
         # Window setup
@@ -52,6 +53,7 @@ class QueryInput:
             kLabel = QtWidgets.QLabel(text="community's structural cohesiveness(k): ")
             dLabel = QtWidgets.QLabel(text="maximum number of hops(d): ")
             eLabel = QtWidgets.QLabel(text="minimum degree of similarity(η): ")
+            cLabel = QtWidgets.QLabel(text="minimum core number (c): ")
             # Create button
             button = QtWidgets.QPushButton("Get Query")
             button.clicked.connect(lambda: self.gui.updateKdSummaryGraph())
@@ -74,6 +76,12 @@ class QueryInput:
             self.queryWindow.eTextBox.setText("0")
             self.queryWindow.eTextBox.returnPressed.connect(button.click)
             self.queryWindow.eTextBox.setToolTip("η controls the minimum degree of similarity between users")
+            # Create c text box
+            self.queryWindow.cTextBox = QtWidgets.QSpinBox()
+            self.queryWindow.cTextBox.setRange(0, 9999)
+            self.queryWindow.cTextBox.setValue(0)
+            self.queryWindow.cTextBox.setToolTip(
+                "c skips users outside the c-core, the largest group where everyone has at least c relations. 0 keeps every user")
             # Add widgets to window
             layout.addWidget(kLabel)
             layout.addWidget(self.queryWindow.kTextBox)
@@ -81,6 +89,8 @@ class QueryInput:
             layout.addWidget(self.queryWindow.dTextBox)
             layout.addWidget(eLabel)
             layout.addWidget(self.queryWindow.eTextBox)
+            layout.addWidget(cLabel)
+            layout.addWidget(self.queryWindow.cTextBox)
             layout.addWidget(button)
         else:
             if self.gui.selectedSocialNetwork is None:
@@ -194,6 +204,7 @@ class QueryInput:
             keyWeightLabel = QtWidgets.QLabel(text="weight of keywords (g): ")
             relWeightLabel = QtWidgets.QLabel(text="weight of relationships (h): ")
             poiWeightLabel = QtWidgets.QLabel(text="weight of POIs (m): ")
+            cLabel = QtWidgets.QLabel(text="minimum core number (c): ")
             # Create button
             button = QtWidgets.QPushButton("Get Query")
             button.clicked.connect(lambda: self.gui.updateCommunitySummaryGraph())
@@ -234,6 +245,12 @@ class QueryInput:
             self.queryWindow.pTextBox.setText("0.2")
             self.queryWindow.pTextBox.returnPressed.connect(button.click)
             self.queryWindow.pTextBox.setToolTip("m controls the weight for POIs for degree of similarity")
+            # Create c text box
+            self.queryWindow.cTextBox = QtWidgets.QSpinBox()
+            self.queryWindow.cTextBox.setRange(0, 9999)
+            self.queryWindow.cTextBox.setValue(0)
+            self.queryWindow.cTextBox.setToolTip(
+                "c skips users outside the c-core, the largest group where everyone has at least c relations. 0 keeps every user")
             # Add widgets to window
             layout.addWidget(kcLabel)
             layout.addWidget(self.queryWindow.kcTextBox)
@@ -247,6 +264,8 @@ class QueryInput:
             layout.addWidget(self.queryWindow.rTextBox)
             layout.addWidget(poiWeightLabel)
             layout.addWidget(self.queryWindow.pTextBox)
+            layout.addWidget(cLabel)
+            layout.addWidget(self.queryWindow.cTextBox)
             layout.addWidget(button)
         else:
             if self.gui.selectedSocialNetwork is None:
@@ -295,6 +314,7 @@ class QueryInput:
             keyWeightLabel = QtWidgets.QLabel(text="weight of keywords (g): ")
             relWeightLabel = QtWidgets.QLabel(text="weight of relationships (h): ")
             poiWeightLabel = QtWidgets.QLabel(text="weight of POIs (m): ")
+            cLabel = QtWidgets.QLabel(text="minimum core number (c): ")
             # Create button
             button = QtWidgets.QPushButton("Get Query")
             button.clicked.connect(lambda: self.gui.updateCommunityTimeSummaryGraph())
@@ -335,6 +355,12 @@ class QueryInput:
             self.queryWindow.pTextBox.setText("0.2")
             self.queryWindow.pTextBox.returnPressed.connect(button.click)
             self.queryWindow.pTextBox.setToolTip("m controls the weight for POIs for degree of similarity")
+            # Create c text box
+            self.queryWindow.cTextBox = QtWidgets.QSpinBox()
+            self.queryWindow.cTextBox.setRange(0, 9999)
+            self.queryWindow.cTextBox.setValue(0)
+            self.queryWindow.cTextBox.setToolTip(
+                "c skips users outside the c-core, the largest group where everyone has at least c relations. 0 keeps every user")
             # Create tS text box
             self.queryWindow.tSTextBox = QtWidgets.QDateEdit()
             self.queryWindow.tSTextBox.setMinimumDate(QtCore.QDate(2020, 1, 1))
@@ -368,6 +394,8 @@ class QueryInput:
             layout.addWidget(self.queryWindow.rTextBox)
             layout.addWidget(poiWeightLabel)
             layout.addWidget(self.queryWindow.pTextBox)
+            layout.addWidget(cLabel)
+            layout.addWidget(self.queryWindow.cTextBox)
             layout.addWidget(button)
         else:
             if self.selectedSocialNetwork is None:
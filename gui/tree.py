@@ -6,6 +6,20 @@ class Mixin:
                 tree['children'].pop(c)
         return tree
     
+    # Adds the road network distance from the tree's root user to every user in the tree. The distances come from a
+    # single search from the root instead of one search per user
+    def roadDistanceTree(self, tree, maxDistance=None):
+        result_users, pass_users = self.treeUsers(tree, [], [])
+        users = list(set(result_users) | set(pass_users))
+        distances = self.selectedSocialNetwork.roadDistances(self.selectedRoadNetwork, tree['user'], users, d=maxDistance)
+        self.setRoadDistance(tree, dict(zip(users, distances)))
+        return tree
+
+    def setRoadDistance(self, tree, roadDistance):
+        tree['roadDistance'] = float(roadDistance[tree['user']])
+        for c in list(tree['children']):
+            self.setRoadDistance(tree['children'][c], roadDistance)
+
     def treeUsers(self, tree, result_user=[], pass_user=[]):
         for c in list(tree['children']):
             self.treeUsers(tree['children'][c], result_user=result_user, pass_user=pass_user)
@@ -16,32 +30,41 @@ class Mixin:
         return result_user, pass_user
 
 
-    def communityTree(self, user, query_keywords, query_rels, community_cohesiveness, g, h ,hops, degSim, parents=[], distance=0, i=0):
+    # Keyword union, keyword intersection size and Jaccard score of a user's keywords against the query keyword set
+    @staticmethod
+    def keywordScore(user_keywords, query_keywords):
+        keyword_intersect = query_keywords.intersection(user_keywords)
+        keyword_union = query_keywords.union(user_keywords)
+        if len(keyword_union) == 0:
+            return list(keyword_union), 0, 0
+        return list(keyword_union), len(keyword_intersect), len(keyword_intersect) / len(keyword_union)
+
+    # query_keywords and query_rels become frozensets at the root and are passed down as they are, since frozenset()
+    # of a frozenset does not copy it. Relations with a core number below minCore are skipped
+    def communityTree(self, user, query_keywords, query_rels, community_cohesiveness, g, h ,hops, degSim, parents=[], distance=0, i=0, minCore=0):
         # Do not repeat nodes
         parents.append(user)
+        network = self.selectedSocialNetwork
+        query_keywords = frozenset(query_keywords)
+        query_rels = frozenset(query_rels)
+        keyword_union, keyword_intersect, keyword_score = self.keywordScore(network.getUserKeywords(user),
+                                                                            query_keywords)
 
         rels = self.selectedSocialNetwork.getUserRel(user)
         rel_users = []
         for r in rels:
             rel_users.append(r[0])
-        if len(set(query_rels) | set(rel_users)) == 0:
+        rel_intersect = len(query_rels & set(rel_users))
+        rel_union = len(query_rels) + len(set(rel_users)) - rel_intersect
+        if rel_union == 0:
             rel_score = 0
         else:
-            rel_score = len(set(query_rels) & set(rel_users)) / len(set(query_rels) | set(rel_users))
-
-        user_keywords = self.selectedSocialNetwork.getUserKeywords(user)
-        keyword_intersect = list(set(user_keywords) & set(query_keywords))
-        keyword_union = list(set(user_keywords) | set(query_keywords))
-
-        if len(keyword_union) == 0:
-            keyword_score = 0
-        else:
-            keyword_score = len(keyword_intersect) / len(keyword_union)
+            rel_score = rel_intersect / rel_union
         
         deg_sim = (g * keyword_score) + (h * rel_score)
 
         deg_sim_satisfy = deg_sim >= degSim
-        if len(keyword_intersect) < community_cohesiveness:
+        if keyword_intersect < community_cohesiveness:
             deg_sim_satisfy = False
 
         result = {
@@ -62,32 +85,31 @@ class Mixin:
         
 
         # Repeat for each relation of a child
-        for r in rel_users:
+        for r in network.usersWithCore([r for r in rel_users if r not in parents], minCore):
             if r not in parents:
-                result['children'][r] = self.communityTree(r, query_keywords, query_rels, community_cohesiveness, g, h, hops, degSim, parents=parents, distance=distance + 1, i=i+1)
+                result['children'][r] = self.communityTree(r, query_keywords, query_rels, community_cohesiveness, g, h, hops, degSim, parents=parents, distance=distance + 1, i=i+1, minCore=minCore)
         return result
     
-    def communityTimeTree(self, user, query_keywords, query_rels, query_pois, start, end, community_cohesiveness, g, h, j, hops, degSim, parents=[], distance=0, i=0):
+    # Same as communityTree but only counts keywords active and POIs visited between start and end
+    def communityTimeTree(self, user, query_keywords, query_rels, query_pois, start, end, community_cohesiveness, g, h, j, hops, degSim, parents=[], distance=0, i=0, minCore=0):
         # Do not repeat nodes
         parents.append(user)
+        network = self.selectedSocialNetwork
+        query_keywords = frozenset(query_keywords)
+        query_rels = frozenset(query_rels)
+        keyword_union, keyword_intersect, keyword_score = self.keywordScore(
+            network.getUserKeywordsActive(user, start, end), query_keywords)
 
         rels = self.selectedSocialNetwork.getUserRel(user)
         rel_users = []
         for r in rels:
             rel_users.append(r[0])
-        if len(set(query_rels) | set(rel_users)) == 0:
+        rel_intersect = len(query_rels & set(rel_users))
+        rel_union = len(query_rels) + len(set(rel_users)) - rel_intersect
+        if rel_union == 0:
             rel_score = 0
         else:
-            rel_score = len(set(query_rels) & set(rel_users)) / len(set(query_rels) | set(rel_users))
-
-        user_keywords = self.selectedSocialNetwork.getUserKeywordsInTime(user, start, end)
-        keyword_intersect = list(set(user_keywords) & set(query_keywords))
-        keyword_union = list(set(user_keywords) | set(query_keywords))
-
-        if len(keyword_union) == 0:
-            keyword_score = 0
-        else:
-            keyword_score = len(keyword_intersect) / len(keyword_union)
+            rel_score = rel_intersect / rel_union
 
         user_pois = self.selectedSocialNetwork.getUserPoiInTime(user, start, end)
         poi_intersect = list(set(user_pois) & set(query_pois))
@@ -102,7 +124,7 @@ class Mixin:
         deg_sim = (g * keyword_score) + (h * rel_score) + (j * poi_score)
 
         deg_sim_satisfy = deg_sim >= degSim
-        if len(keyword_intersect) < community_cohesiveness:
+        if keyword_intersect < community_cohesiveness:
             deg_sim_satisfy = False
 
         result = {
@@ -124,14 +146,19 @@ class Mixin:
         
 
         # Repeat for each relation of a child
-        for r in rel_users:
+        for r in network.usersWithCore([r for r in rel_users if r not in parents], minCore):
             if r not in parents:
-                result['children'][r] = self.communityTimeTree(r, query_keywords, query_rels, query_pois, start, end, community_cohesiveness, g, h, j, hops, degSim, parents=parents, distance=distance + 1, i=i+1)
+                result['children'][r] = self.communityTimeTree(r, query_keywords, query_rels, query_pois, start, end, community_cohesiveness, g, h, j, hops, degSim, parents=parents, distance=distance + 1, i=i+1, minCore=minCore)
         return result
 
-    def kdTree(self, queryKeywords, user, keywords, distance, hops, hopDepth=0, currentDist=0,  parents=[]):
+    # hopArray holds the hops from the query user to every user, found by one search from the root. A node's 'hops' is
+    # its fewest hop distance from the query user rather than its depth in the tree. Relations with a core number below
+    # minCore are not expanded
+    def kdTree(self, queryKeywords, user, keywords, distance, hops, hopDepth=0, currentDist=0,  parents=[], hopArray=None, minCore=0):
         # Do not repeat nodes
         parents.append(user)
+        if hopArray is None:
+            hopArray = self.selectedSocialNetwork.hopArray(user, hops)
         userKeywords = self.selectedSocialNetwork.getUserKeywords(user)
         commonKeywords = list(set(userKeywords) & set(queryKeywords))
 
@@ -143,7 +170,7 @@ class Mixin:
             'user': user,
             'distance': currentDist,
             'keywords': commonKeywords,
-            'hops': hopDepth,
+            'hops': self.selectedSocialNetwork.hopsIn(hopArray, user),
             'satisfy': satisfy,
             'children': {}
         }
@@ -155,7 +182,8 @@ class Mixin:
             return result
 
         # Repeat for each relation of a child
+        cohesive = set(self.selectedSocialNetwork.usersWithCore([r[0] for r in relations], minCore))
         for r in relations:
-            if r[0] not in parents:
-                result['children'][r[0]] = self.kdTree(queryKeywords, r[0], keywords, distance, hops, hopDepth=hopDepth + 1, currentDist=currentDist + float(r[1]),  parents=parents)
+            if r[0] not in parents and r[0] in cohesive:
+                result['children'][r[0]] = self.kdTree(queryKeywords, r[0], keywords, distance, hops, hopDepth=hopDepth + 1, currentDist=currentDist + float(r[1]),  parents=parents, hopArray=hopArray, minCore=minCore)
         return result
\ No newline at end of file
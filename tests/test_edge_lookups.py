@@ -0,0 +1,42 @@
+from RoadNetwork import RoadNetwork
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks the edge lookups of RoadNetwork by node id and by node index, both after parsing the road files and
+#       after loading the saved snapshot.
+#
+# =====================================================================================================================
+
+
+# Writes rows under header to path as a csv file
+def write(path, header, rows):
+    with open(path, 'w') as f:
+        f.write(header + "\n")
+        for row in rows:
+            f.write(",".join(str(value) for value in row) + "\n")
+    return str(path)
+
+
+# Road 0.0 - 1.0 - 2.0 with edges of length 1 and 2.50
+def road(folder):
+    edgeFile = write(folder / "edge.csv", "edge_id,start_id,end_id,distance", [(0.0, 0.0, 1.0, "1.0"),
+                                                                                 (1.0, 1.0, 2.0, "2.50")])
+    nodeFile = write(folder / "node.csv", "node_id,lat_pos,lon_pos", [(0.0, 0.0, 0.0), (1.0, 1.0, 0.0),
+                                                                      (2.0, 2.0, 0.0)])
+    return RoadNetwork("Road", edgeFile=edgeFile, nodeFile=nodeFile)
+
+
+def test_edge_lookups(tmp_path):
+    # The first network parses the files, the second one loads the snapshot the first saved
+    for _ in range(2):
+        network = road(tmp_path)
+        assert network.isAnEdge("1.0", "0.0") == 0.0
+        assert network.isAnEdge("0.0", "2.0") is None
+        assert network.isAnEdge("0.0", "9.0") is None
+        assert network.getEdgeDistance("1.0") == "2.50"
+        rows, weights = network.edgesExist([[0, 1], [2, 1], [0, 2]])
+        assert rows.tolist() == [0, 1, -1] and weights[:2].tolist() == [1.0, 2.5]
+        network.distanceCache.close()
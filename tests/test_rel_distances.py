@@ -0,0 +1,64 @@
+import pytest
+from RoadGraph import fileChecksum
+from RoadNetwork import RoadNetwork
+from SocialNetwork import SocialNetwork
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks that the road distances stored in a rel file are only used with the road network UserDistance routed
+#       them on, and that any other road network gets distances routed on itself.
+#
+# =====================================================================================================================
+
+
+# Writes rows under header to path as a csv file
+def write(path, header, rows):
+    with open(path, 'w') as f:
+        f.write(header + "\n")
+        for row in rows:
+            f.write(",".join(str(value) for value in row) + "\n")
+    return str(path)
+
+
+# Road of three nodes in a line, with the edges weighted by scale
+def road(folder, scale):
+    folder.mkdir()
+    edgeFile = write(folder / "edge.csv", "edge_id,start_id,end_id,distance",
+                     [(0.0, 0.0, 1.0, 1.0 * scale), (1.0, 1.0, 2.0, 2.0 * scale)])
+    nodeFile = write(folder / "node.csv", "node_id,lat_pos,lon_pos",
+                     [(0.0, 0.0, 0.0), (1.0, 1.0, 0.0), (2.0, 2.0, 0.0)])
+    return RoadNetwork("Road", edgeFile=edgeFile, nodeFile=nodeFile)
+
+
+# Users 1 and 3 on the ends of the road are related, with a stored distance of 10 that no road network agrees with
+@pytest.fixture
+def network(tmp_path):
+    relFile = write(tmp_path / "rel.csv", "user_id,rel_user_id,weight,distance,keywords",
+                    [(1.0, 3.0, 0.5, 10.0, 0), (3.0, 1.0, 0.5, 10.0, 0), (1.0, 2.0, 0.5, 10.0, 0)])
+    locFile = write(tmp_path / "loc.csv", "user_id,lat_pos,lon_pos", [(1.0, 0.0, 0.0), (2.0, 1.0, 0.0),
+                                                                      (3.0, 2.0, 0.0)])
+    return tmp_path, relFile, locFile
+
+
+def test_distances_without_road_file(network):
+    folder, relFile, locFile = network
+    social = SocialNetwork("Social", relFile=relFile, locFile=locFile)
+    routed = road(folder / "road", 1)
+    assert social.edgeRoadDistance(routed, "1.0", "3.0") is None
+    assert social.usersWithinDistance(routed, "1.0", ["2.0", "3.0"], d=5)[1] == {"2.0": 1.0, "3.0": 3.0}
+
+
+def test_distances_only_for_their_road(network):
+    folder, relFile, locFile = network
+    routed = road(folder / "road", 1)
+    with open(folder / "rel.road", 'w') as f:
+        f.write(fileChecksum(str(folder / "road" / "edge.csv")))
+    social = SocialNetwork("Social", relFile=relFile, locFile=locFile)
+    assert social.edgeRoadDistance(routed, "1.0", "3.0") == 10.0
+    assert social.usersWithinDistance(routed, "1.0", ["2.0", "3.0"], d=20)[1] == {"2.0": 10.0, "3.0": 10.0}
+    other = road(folder / "other", 2)
+    assert social.edgeRoadDistance(other, "1.0", "3.0") is None
+    assert social.usersWithinDistance(other, "1.0", ["2.0", "3.0"], d=20)[1] == {"2.0": 2.0, "3.0": 6.0}
@@ -0,0 +1,85 @@
+import random
+import shutil
+from os.path import dirname, exists, join
+import numpy as np
+import pytest
+from SocialNetwork import SocialNetwork
+from Truss import TrussIndex
+from Cores import CoreIndex
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks that relation edits through addRelation() and removeRelation() keep the truss decomposition and core
+#       numbers identical to decomposing the edited graph again, and that indexes saved for the rel file are neither
+#       used for nor overwritten by an edited graph.
+#
+# =====================================================================================================================
+
+GOWALLA_REL = join(dirname(dirname(__file__)), "Datasets", "SocialNetworks", "Gowalla", "gowalla_rel.csv")
+
+
+# Gowalla relations copied next to the test so saved indexes do not end up in the dataset folder
+@pytest.fixture
+def relFile(tmp_path):
+    path = str(tmp_path / "gowalla_rel.csv")
+    shutil.copy(GOWALLA_REL, path)
+    return path
+
+
+# Random relation edits: removes existing relations and adds new ones between known users
+def edit(network, count, seed):
+    rng = random.Random(seed)
+    users = [network.userId(user) for user in range(network.userCount())]
+    for step in range(count):
+        if step % 2:
+            e = rng.randrange(network.truss.edgeCount())
+            network.removeRelation(network.userId(int(network.truss.start[e])),
+                                   network.userId(int(network.truss.end[e])))
+        else:
+            user, other = rng.sample(users, 2)
+            network.addRelation(user, other)
+    # Close triangles too, which is where trussness changes
+    for step in range(count // 2):
+        e = rng.randrange(network.truss.edgeCount())
+        a, b = int(network.truss.start[e]), int(network.truss.end[e])
+        neighbors = network.graph.neighbors(b)[0].tolist()
+        if neighbors:
+            network.addRelation(network.userId(a), network.userId(rng.choice(neighbors)))
+
+
+def test_incremental_matches_rebuild(relFile):
+    network = SocialNetwork("Gowalla", relFile=relFile)
+    network.buildTruss()
+    network.buildCores()
+    edit(network, 200, 7)
+    truss = TrussIndex.build(network.graph)
+    assert np.array_equal(network.truss.start, truss.start)
+    assert np.array_equal(network.truss.end, truss.end)
+    assert np.array_equal(network.truss.trussness, truss.trussness)
+    assert np.array_equal(network.cores.cores, CoreIndex.build(network.graph).cores)
+
+
+def test_edits_bypass_saved_indexes(relFile):
+    network = SocialNetwork("Gowalla", relFile=relFile)
+    network.buildTruss()
+    # The index is updated in place by the edits, so keep the arrays that were saved
+    saved = (network.truss.start.copy(), network.truss.trussness.copy())
+    edit(network, 20, 3)
+    # Rebuilt from the edited graph instead of loaded from <rel file>.truss.npz
+    network.truss = None
+    network.buildTruss()
+    assert not np.array_equal(network.truss.start, saved[0])
+    assert np.array_equal(network.truss.trussness, TrussIndex.build(network.graph).trussness)
+    # Nothing built from the edited graph is saved for the unedited rel file
+    network.buildCores()
+    network.buildHopLabels()
+    base = relFile[:-len(".csv")]
+    assert not exists(base + ".cores.npz")
+    assert not exists(base + ".hops.npz")
+    fresh = SocialNetwork("Gowalla", relFile=relFile)
+    fresh.buildTruss()
+    assert np.array_equal(fresh.truss.start, saved[0])
+    assert np.array_equal(fresh.truss.trussness, saved[1])
@@ -0,0 +1,43 @@
+from RoadNetwork import RoadNetwork
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks that distances and routing tables saved next to a road network are not reused once the node file
+#       changes, even when the edge file stays the same.
+#
+# =====================================================================================================================
+
+
+# Writes rows under header to path as a csv file
+def write(path, header, rows):
+    with open(path, 'w') as f:
+        f.write(header + "\n")
+        for row in rows:
+            f.write(",".join(str(value) for value in row) + "\n")
+    return str(path)
+
+
+# Road 0.0 - 1.0 - 2.0 with edges of length 1 and 2, and its nodes in the given order
+def road(folder, nodes, routing="dijkstra"):
+    edgeFile = write(folder / "edge.csv", "edge_id,start_id,end_id,distance", [(0.0, 0.0, 1.0, 1.0),
+                                                                                 (1.0, 1.0, 2.0, 2.0)])
+    coords = {0.0: (0.0, 0.0), 1.0: (1.0, 0.0), 2.0: (2.0, 0.0)}
+    nodeFile = write(folder / "node.csv", "node_id,lat_pos,lon_pos", [(node,) + coords[node] for node in nodes])
+    return RoadNetwork("Road", edgeFile=edgeFile, nodeFile=nodeFile, routing=routing)
+
+
+def test_node_file_change_resets_caches(tmp_path):
+    for routing in ("dijkstra", "ch", "alt"):
+        folder = tmp_path / routing
+        folder.mkdir()
+        network = road(folder, [0.0, 1.0, 2.0], routing)
+        assert network.realUserDistance("0.0", "1.0") == 1.0
+        network.distanceCache.close()
+        # Same edges, but the node positions of 0.0 and 2.0 are swapped
+        network = road(folder, [2.0, 1.0, 0.0], routing)
+        assert network.distanceCache.diskHits == 0
+        assert network.realUserDistance("2.0", "1.0") == 2.0
+        assert network.realUserDistance("0.0", "2.0") == 3.0
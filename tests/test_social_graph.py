@@ -0,0 +1,41 @@
+import numpy as np
+from SocialGraph import SocialGraph
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks hop counts and paths of SocialGraph on a chain of users longer than an int8 hop array can hold, and that
+#       relation weights keep the values of the rel file.
+#
+# =====================================================================================================================
+
+
+# Users 0 - 1 - ... - (n - 1) in a line, with one relation row per pair
+def chain(n):
+    return SocialGraph(n, np.arange(n - 1), np.arange(1, n), np.ones(n - 1))
+
+
+def test_unbounded_hops_beyond_int8():
+    graph = chain(300)
+    hops = graph.hops(0)
+    assert hops.dtype == np.int32
+    assert np.array_equal(hops, np.arange(300))
+    assert graph.hops(0, target=299)[299] == 299
+    assert graph.path(0, 299) == list(range(300))
+
+
+def test_bounded_hops():
+    graph = chain(300)
+    hops = graph.hops(0, 100)
+    assert hops.dtype == np.int8
+    assert hops[100] == 100 and hops[101] == -1
+    hops = graph.hops(0, 200)
+    assert hops.dtype == np.int32
+    assert hops[200] == 200 and hops[201] == -1
+
+
+def test_weights_as_in_rel_file():
+    graph = SocialGraph(3, [0, 0], [1, 2], [0.01, 0.229166666667])
+    assert graph.neighbors(0)[1].tolist() == [0.01, 0.229166666667]
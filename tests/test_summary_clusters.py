@@ -0,0 +1,34 @@
+import numpy as np
+from ClusterPyramid import ClusterPyramid
+from SocialNetwork import SocialNetwork
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks that summaries asking for more clusters than the cluster tree has leaves still get every cluster.
+#
+# =====================================================================================================================
+
+
+# Social network of 50 users with one random location each
+def network(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "loc.csv"
+    with open(path, 'w') as f:
+        f.write("user_id,lat_pos,lon_pos\n")
+        for user, (lat, lon) in enumerate(rng.uniform(0, 10, (50, 2)).tolist()):
+            f.write(f"{user}.0,{lat},{lon}\n")
+    return SocialNetwork("Summary", locFile=str(path))
+
+
+def test_more_clusters_than_leaves(tmp_path, monkeypatch):
+    monkeypatch.setattr(ClusterPyramid, "LEAVES", 8)
+    social = network(tmp_path)
+    ids, centers, sizes, relations, popSize = social.getSummaryClusters(5)
+    assert len(ids) == 5 and social.clusterRuns[-1]["clustering"] == "pyramid"
+    ids, centers, sizes, relations, popSize = social.getSummaryClusters(20)
+    assert len(ids) == 20 and sum(popSize) == 50
+    assert social.clusterRuns[-1]["clustering"] == "kmeans"
+    assert social.clustering == "pyramid"
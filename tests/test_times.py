@@ -0,0 +1,46 @@
+from SocialNetwork import SocialNetwork
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks that keyword and POI visit times come back exactly as written in the files, while time windows still
+#       filter on the parsed days, whether the times are ISO 8601 or in another format dateutil understands.
+#
+# =====================================================================================================================
+
+
+# Writes rows under header to path as a csv file
+def write(path, header, rows):
+    with open(path, 'w') as f:
+        f.write(header + "\n")
+        for row in rows:
+            f.write(",".join(str(value) for value in row) + "\n")
+    return str(path)
+
+
+def test_times_as_written(tmp_path):
+    keyFile = write(tmp_path / "key.csv", "id,keyword,start_time,end_time",
+                    [(2, 65, "2020-01-17T10:30:00", "2020-10-17"), (2, 11, "2020-06-25", "2020-12-27")])
+    keyMapFile = write(tmp_path / "key_map.csv", "keyword_id,keyword", [(65, "coffee"), (11, "tea")])
+    poiFile = write(tmp_path / "poi.csv", "user_id,poi_id,time",
+                    [("2.0", 7, "2020-03-01T08:00:00"), ("2.0", 8, "2020-05-01"), ("2.0", 7, "2020-07-01")])
+    network = SocialNetwork("Times", keyFile=keyFile, keyMapFile=keyMapFile, poiFile=poiFile)
+    assert network.getUserKeywordsTime("2.0", "65") == ["2020-01-17T10:30:00", "2020-10-17"]
+    assert network.getUserKeywordsTime("2.0", "11") == ["2020-06-25", "2020-12-27"]
+    assert network.userKeywordTime("2.0", 11) == ["2020-06-25", "2020-12-27"]
+    assert network.getUserPoiTime("2.0", "7") == ["2020-03-01T08:00:00", "2020-07-01"]
+    assert network.getUserPoiTime("2.0", "8") == ["2020-05-01"]
+    assert network.getUserKeywordsInTime("2.0", "2020-01-17", "2020-02-01") == ["65"]
+    assert network.getUserPoiInTime("2.0", "2020-03-01", "2020-05-01") == ["7", "8"]
+
+
+def test_times_in_other_formats(tmp_path):
+    keyFile = write(tmp_path / "key.csv", "id,keyword,start_time,end_time",
+                    [(2, 65, "01/17/2020 10:30", "2020-10-17"), (2, 11, "2020-06-25", "Dec 27 2020")])
+    keyMapFile = write(tmp_path / "key_map.csv", "keyword_id,keyword", [(65, "coffee"), (11, "tea")])
+    network = SocialNetwork("Times", keyFile=keyFile, keyMapFile=keyMapFile)
+    assert network.getUserKeywordsTime("2.0", "65") == ["01/17/2020 10:30", "2020-10-17"]
+    assert network.getUserKeywordsInTime("2.0", "2020-01-17", "2020-02-01") == ["65"]
+    assert network.getUserKeywordsActive("2.0", "2020-12-20", "2020-12-31") == ["11"]
@@ -0,0 +1,33 @@
+import numpy as np
+from SocialGraph import SocialGraph
+from Truss import TrussIndex
+
+# =====================================================================================================================
+#
+#   Project: Spatial-Social Networks
+#
+#   Purpose:
+#       Checks the truss decomposition of social graphs without any relations.
+#
+# =====================================================================================================================
+
+
+# Graph of n users and no relations
+def empty(n):
+    return SocialGraph(n, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0))
+
+
+def test_empty_graph():
+    for n in (0, 3):
+        truss = TrussIndex.build(empty(n))
+        assert truss.edgeCount() == 0
+        assert truss.trussness.dtype == np.int32
+        assert np.array_equal(truss.userTrussness(), np.zeros(n))
+
+
+def test_insert_into_empty_graph():
+    truss = TrussIndex.build(empty(3))
+    for a, b in ((0, 1), (1, 2), (0, 2)):
+        truss.insertEdge(a, b)
+    assert truss.edgeCount() == 3
+    assert np.array_equal(truss.trussness, [3, 3, 3])